@@ -3,14 +3,14 @@ __version__ = "v0.0.1"
 import sys
 import os
 import logging
-from collections import OrderedDict
+from collections import OrderedDict, deque
 import time
 import json
 import re
 import sublime
 import webbrowser
 import string
-import copy
+from threading import Lock
 
 
 from sublime_plugin import WindowCommand, EventListener, TextCommand
@@ -18,11 +18,24 @@ from Default.paragraph import expand_to_paragraph
 from .SumoSwissKnifeAPI.Storage import Storage, Settings
 from .SumoSwissKnifeAPI.Connection import Connection
 from .SumoSwissKnifeAPI.History import History
-from .SumoSwissKnifeAPI.Completion import Completion
+from .SumoSwissKnifeAPI.Completion import Completion, UserFieldCache
+from .SumoSwissKnifeAPI.Executor import CommandExecutor
+from .SumoSwissKnifeAPI.JobPoller import JobPoller
+from .SumoSwissKnifeAPI.Sharded import ShardedSearch, AggregationPlan, \
+    mergeMessages
+from .SumoSwissKnifeAPI.Spool import ResultSpool, pruneSpools
+from .SumoSwissKnifeAPI.ResultCache import ResultCache, messageTime
+from .SumoSwissKnifeAPI.Table import TableWriter, STREAMING_FORMATS
+from .SumoSwissKnifeAPI.Columnar import ColumnarResult
+from .SumoSwissKnifeAPI.Pipeline import LocalPipeline, PipelineError
+from .SumoSwissKnifeAPI.Sync import SyncState
+from .SumoSwissKnifeAPI.MetadataStore import MetadataStore
 from .SumoSwissKnifeAPI.Utils import get_time_window_mappings_list,\
     get_query_time_window, printProgressBar, get_all_timezones,\
-    get_tz_specifc_time, get_tz_specifc_ts, parseRawJson, \
-    saveRawJson, get_formatted_results, toTitle, merge_dicts, pprint
+    get_tz_specifc_time, get_tz_specifc_ts, get_formatted_results, \
+    toTitle, merge_dicts, indexCollectorNames, columnTitle, \
+    CsvWriter, Convertor
+from .SumoSwissKnifeAPI.Export import SqliteExport
 
 
 MESSAGE_RUNNING_CMD = 'Calling Sumo Logic Endpoint...'
@@ -33,6 +46,8 @@ SumoSwissKnife_SETTINGS_FILE = 'SumoSwissKnife.sublime-settings'
 SumoSwissKnife_CONNECTIONS_FILE = 'SumoSwissKnifeConnections.sublime-settings'
 SumoSwissKnife_QUERIES_FILE = 'SumoSwissKnifeSavedQueries.sublime-settings'
 SumoSwissKnife_METADATA_FOLDER = 'SumoSwissKnife_DB'
+REFRESHABLE_METADATA = ['collectors', 'fers', 'partitions', 'svs', 'roles',
+                        'users']
 
 
 USER_FOLDER = None
@@ -49,6 +64,8 @@ settingsStore = None
 queriesStore = None
 connectionsStore = None
 historyStore = None
+commandExecutor = None
+jobPoller = None
 SUMOLOGIC_COMPLETIONS = None
 
 DEFAULT_LOG_LEVEL = logging.WARNING
@@ -65,6 +82,25 @@ plugin_logger.setLevel(DEFAULT_LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
+class ConnectionMetadata(object):
+    fields = ['collectors', 'savedQueries', 'fers', 'roles', 'users', 'views',
+              'partitions', 'role_lookup', 'source_categories',
+              'collectors_names', 'sources_names']
+
+    def __init__(self):
+        self.collectors = {}
+        self.savedQueries = {}
+        self.fers = []
+        self.roles = []
+        self.users = []
+        self.views = []
+        self.partitions = []
+        self.role_lookup = {}
+        self.source_categories = []
+        self.collectors_names = []
+        self.sources_names = []
+
+
 def getSublimeUserFolder():
     return os.path.join(sublime.packages_path(), 'User')
 
@@ -75,7 +111,7 @@ def startPlugin():
     global CONNECTIONS_FILENAME, CONNECTIONS_FILENAME_DEFAULT
     global QUERIES_FILENAME, QUERIES_FILENAME_DEFAULT, METADATA_FOLDER
     global settingsStore, queriesStore, connectionsStore, historyStore
-    global decoder, SUMOLOGIC_COMPLETIONS
+    global decoder, SUMOLOGIC_COMPLETIONS, commandExecutor, jobPoller
 
     USER_FOLDER = getSublimeUserFolder()
     DEFAULT_FOLDER = os.path.dirname(__file__)
@@ -137,8 +173,24 @@ def startPlugin():
     else:
         plugin_logger.setLevel(DEFAULT_LOG_LEVEL)
 
+    if commandExecutor:
+        commandExecutor.shutdown()
+
+    commandExecutor = CommandExecutor(
+        maxWorkers=settingsStore.get('worker_pool_size', 8),
+        maxPerKey=settingsStore.get('max_concurrent_requests', 4))
+
+    if jobPoller:
+        jobPoller.shutdown()
+
+    jobPoller = JobPoller(
+        minInterval=settingsStore.get('search_poll_min_interval', 0.5),
+        maxInterval=settingsStore.get('search_poll_max_interval', 30),
+        backoff=settingsStore.get('search_poll_backoff', 1.5))
+
     Connection.setTimeout(settingsStore.get('thread_timeout', 15))
     Connection.setHistoryManager(historyStore)
+    Connection.setExecutor(commandExecutor)
 
     logger.info('plugin (re)loaded')
     logger.info('version %s', __version__)
@@ -172,6 +224,70 @@ def getDefaultConnectionName():
     return default
 
 
+class OutputSink(object):
+    """ buffers writes to an output view and flushes them on the main thread,
+    small writes batched together, large ones in chunks with the UI let
+    through in between """
+
+    def __init__(self, panel, onInitialOutput=None, read_only=True):
+        self.panel = panel
+        self.onInitialOutput = onInitialOutput
+        self.read_only = read_only
+        self.chunkSize = settingsStore.get('output_chunk_size', 262144)
+        self.flushDelay = settingsStore.get('output_flush_delay_ms', 50)
+        self.buffer = deque()
+        self.scheduled = False
+        self.initial = True
+        self.lock = Lock()
+
+    def append(self, outputContent, params=None):
+        if outputContent is None:
+            return
+        if not isinstance(outputContent, str):
+            outputContent = str(outputContent)
+
+        with self.lock:
+            self.buffer.append(outputContent)
+            if self.scheduled:
+                return
+            self.scheduled = True
+        sublime.set_timeout(self.flush, self.flushDelay)
+
+    def _take(self):
+        """ up to chunkSize buffered characters, cut after a line end when possible """
+        pieces = []
+        size = 0
+        while self.buffer and size < self.chunkSize:
+            piece = self.buffer.popleft()
+            room = self.chunkSize - size
+            if len(piece) > room:
+                cut = piece.rfind('\n', 0, room) + 1 or room
+                self.buffer.appendleft(piece[cut:])
+                piece = piece[:cut]
+            pieces.append(piece)
+            size += len(piece)
+        return ''.join(pieces)
+
+    def flush(self):
+        with self.lock:
+            characters = self._take()
+            more = bool(self.buffer)
+            self.scheduled = more
+
+        if self.initial:
+            self.initial = False
+            if self.onInitialOutput:
+                self.onInitialOutput()
+
+        if characters:
+            self.panel.set_read_only(False)
+            self.panel.run_command('append', {'characters': characters})
+            self.panel.set_read_only(self.read_only)
+
+        if more:
+            sublime.set_timeout(self.flush, 1)
+
+
 def createOutput(panel=None, name=None, syntax=None,
                  prependText=None, show_result_on_window_rt=True, read_only = True):
     onInitialOutput = None
@@ -181,24 +297,14 @@ def createOutput(panel=None, name=None, syntax=None,
             show_result_on_window_rt=show_result_on_window_rt) if name else \
             getOutputPlace(
             syntax, show_result_on_window_rt=show_result_on_window_rt)
-    if prependText:
-        panel.run_command('append', {'characters': str(prependText)})
-
-    initial = True
-
-    def append(outputContent, params=None):
-        nonlocal initial
-        if initial:
-            initial = False
-            if onInitialOutput:
-                onInitialOutput()
-
+    else:
         panel.set_syntax_file(SYNTAX_Sumo)
-        panel.set_read_only(False)
-        panel.run_command('append', {'characters': outputContent})
-        panel.set_read_only(read_only)
 
-    return append
+    sink = OutputSink(panel, onInitialOutput, read_only=read_only)
+    if prependText:
+        sink.append(str(prependText))
+
+    return sink.append
 
 
 def toNewTab(content, name="", suffix="SumoSwissKnife Saved Query"):
@@ -345,8 +451,11 @@ class ST(EventListener):
     ready = False
     selected_accessId = None
     current_connection_metadata_folder = None
+    metadata_store = None
     results_format = None
     search_job_id = None
+    result_spool = None
+    result_cache = None
     message_count = 0
     record_count = 0
     results_page_size = 0
@@ -360,7 +469,27 @@ class ST(EventListener):
     users = []
     role_lookup = {}
     collector_offset = 0
-    load_connection_data_stats = {'collectors': False, 'sources': {}, 'fers': False, 'roles': False, 'users': False, 'exports': False, 'partitions': False, 'svs': False}
+    load_connection_data_stats = {'collectors': False, 'sources': False, 'fers': False, 'roles': False, 'users': False, 'exports': False, 'partitions': False, 'svs': False}
+    load_connection_data_lock = Lock()
+
+    @staticmethod
+    def on_modified_async(view):
+        if not view.match_selector(0, 'source.sumo'):
+            return
+
+        changeCount = view.change_count()
+
+        def refreshUserFields():
+            # only once typing settled, the next completion finds them ready
+            if view.is_valid() and view.change_count() == changeCount \
+                    and not UserFieldCache.isCurrent(view):
+                UserFieldCache.refresh(view, changeCount)
+
+        sublime.set_timeout_async(refreshUserFields, 300)
+
+    @staticmethod
+    def on_close(view):
+        UserFieldCache.discard(view)
 
     @staticmethod
     def on_selection_modified(view):
@@ -487,6 +616,31 @@ class ST(EventListener):
         except FileExistsError as e:
             logger.info('File already exists')
 
+        with ST.load_connection_data_lock:
+            # loads still holding the old store stop using it once it is
+            # swapped, see ownsStore in loadConnectionData
+            if ST.metadata_store:
+                ST.metadata_store.close()
+
+            ST.metadata_store = MetadataStore(os.path.join(
+                        ST.current_connection_metadata_folder, 'metadata.db'))
+
+        pruneSpools(ST.jobsFolder(),
+                    settingsStore.get('spool_max_age_hours', 24) * 3600)
+
+        ST.result_cache = ResultCache(
+            ST.jobsFolder(),
+            maxEntries=settingsStore.get('result_cache_max_entries', 50),
+            maxBytes=settingsStore.get('result_cache_max_mb', 256) * 1024 * 1024,
+            ttl=settingsStore.get('result_cache_ttl_minutes', 15) * 60)
+
+        if ST.metadata_store.isEmpty():
+            imported = ST.metadata_store.importLegacy(
+                                        ST.current_connection_metadata_folder)
+            if imported:
+                logger.info('imported cached {0} into metadata.db'.format(
+                                                        ', '.join(imported)))
+
         def mergeConfig(config, promptedKeys=None):
             merged = config.copy()
             if promptedKeys:
@@ -500,7 +654,8 @@ class ST(EventListener):
                 Window().status_message(
                     __package__ + ": " + str(e).splitlines()[0])
                 raise e
-            ST.loadConnectionData(callback)
+            # cached metadata is read and indexed off the main thread
+            commandExecutor.submit(lambda: ST.loadConnectionData(callback))
 
         if not promptKeys:
             createConnection(connectionName, config, settings, callback)
@@ -531,128 +686,171 @@ class ST(EventListener):
         promptNext()
 
     @staticmethod
-    def check_connection_data_progress():
-        stats = True
-        for val in ST.load_connection_data_stats.values():
-            if isinstance(val, dict):
-                for entry in val.values():
-                    stats = stats and entry
-            stats = stats and val
-        return stats
+    def swapConnectionData(conn, data, completion):
+        with ST.load_connection_data_lock:
+            # the connection was switched while this data was loading
+            if ST.conn is not conn:
+                return False
+
+            for field in ConnectionMetadata.fields:
+                setattr(ST, field, getattr(data, field))
+            ST.completion = completion
+            ST.ready = True
+            return True
 
     @staticmethod
-    def loadConnectionData(callback=None):
+    def loadConnectionData(callback=None, incremental=False, resources=None,
+                           background=False, full=False):
         # if not View().match_selector(0, 'source.sumo'):
         #     return None
 
-        update_connection_loading_wip = createOutput(name='Logs',
-            syntax=SYNTAX_Sumo, show_result_on_window_rt=False)
-        objectsLoaded = 0
+        if background:
+            def update_connection_loading_wip(outputContent, params=None):
+                logger.debug(outputContent.strip())
+        else:
+            update_connection_loading_wip = createOutput(name='Logs',
+                syntax=SYNTAX_Sumo, show_result_on_window_rt=False)
 
         if not ST.conn:
             return
 
-        def afterAllDataHasLoaded(saveRawJsonMeta=False):
-
-            if saveRawJsonMeta:
-                saveRawJson(ST.collectors, os.path.join(
-                        ST.current_connection_metadata_folder, 'collectors'))
-
-                update_connection_loading_wip('\n - {num} Collectors cached!\n'.format(num=len(ST.collectors)))
-
-                saveRawJson(ST.savedQueries, os.path.join(
-                        ST.current_connection_metadata_folder, 'queries'))
-
-                update_connection_loading_wip('\n - {num} Personal Folder queries cached!\n'.format(num=len(ST.savedQueries)))
-
-                saveRawJson(ST.fers, os.path.join(
-                        ST.current_connection_metadata_folder, 'fers'))
-
-                update_connection_loading_wip('\n - {num} FERs cached!\n'.format(num=len(ST.fers)))
-
-                saveRawJson(ST.partitions, os.path.join(
-                        ST.current_connection_metadata_folder, 'partitions'))
-
-                update_connection_loading_wip('\n - {num} Partitions Indecies cached!\n'.format(num=len(ST.partitions)))
-
-                saveRawJson(ST.views, os.path.join(
-                        ST.current_connection_metadata_folder, 'views'))
-
-                update_connection_loading_wip('\n - {num} Scheduled Views cached!\n'.format(num=len(ST.views)))
-
-                saveRawJson(ST.roles, os.path.join(
-                        ST.current_connection_metadata_folder, 'roles'))
-
-                update_connection_loading_wip('\n - {num} Roles cached!\n'.format(num=len(ST.roles)))
-
-                saveRawJson(ST.users, os.path.join(
-                        ST.current_connection_metadata_folder, 'users'))
-
-                update_connection_loading_wip('\n - {num} Users cached!\n'.format(num=len(ST.users)))
-
-            total_sources = 0
+        conn = ST.conn
+        data = ConnectionMetadata()
+        progress = {resource: False for resource in ST.load_connection_data_stats}
+        progressLock = Lock()
+        progressDone = False
+        collectorOffset = 0
+        fetchedFromApi = False
+        fetchedResources = set()
+        cachedCollectors = {}
+        cachedMetadata = {}
+        store = ST.metadata_store
+        syncState = None
+        sourcesSyncTtl = settingsStore.get('sources_sync_ttl_hours', 24) * 3600
+
+        def ownsStore():
+            # setConnection closes the store this load started with; only
+            # call under load_connection_data_lock
+            return ST.conn is conn and ST.metadata_store is store
+
+        def markLoaded(resource, saveRawJsonMeta):
+            nonlocal fetchedFromApi, progressDone
+            with progressLock:
+                fetchedFromApi = fetchedFromApi or saveRawJsonMeta
+                if saveRawJsonMeta:
+                    fetchedResources.add(resource)
+                progress[resource] = True
+                if progressDone or not all(progress.values()):
+                    return
+                progressDone = True
+            afterAllDataHasLoaded(fetchedFromApi)
+
+        def refreshStaleData():
+            ttl = settingsStore.get('metadata_ttl_minutes', 60) * 60
+            if ttl <= 0:
+                return
 
-            for collector in ST.collectors.values():
+            stale = [resource for resource in REFRESHABLE_METADATA
+                     if resource not in fetchedResources and syncState.isStale(resource, ttl)]
+            if not stale:
+                return
 
-                if 'name' in collector.keys() \
-                    and collector['name'] \
-                        not in ST.collectors_names:
-                    if saveRawJsonMeta:
-                        update_connection_loading_wip('\n - Loading The [{collectector_name}] Collector'.format(collectector_name=collector['name']))
-                    ST.collectors_names.append(
-                        collector['name'])
+            update_connection_loading_wip(' - Refreshing {resources} in the background\n'.format(
+                resources=', '.join(toTitle(resource) for resource in stale)))
+            ST.loadConnectionData(incremental=True, resources=stale, background=True)
+
+        def loadFailed(resource):
+            # keep serving the cached copy rather than caching the failure
+            attr = {'svs': 'views'}.get(resource, resource)
+            if resource in cachedMetadata:
+                setattr(data, attr, cachedMetadata[resource])
+                if resource == 'roles':
+                    data.role_lookup = {role['id']: {'name': role['name'], 'capabilities': role['capabilities']}
+                                      for role in data.roles}
+            markLoaded(resource, False)
+
+        def reportSync(resource_name, added, changed, removed):
+            update_connection_loading_wip(' - {resource_name}: {added} New, {changed} Changed, {removed} Removed\n'.format(
+                resource_name=resource_name, added=len(added), changed=len(changed), removed=len(removed)))
+
+        def syncResources():
+            synced = OrderedDict([('fers', data.fers), ('partitions', data.partitions),
+                                     ('svs', data.views), ('roles', data.roles), ('users', data.users)])
+
+            for resource, items in synced.items():
+                if resource not in fetchedResources or not isinstance(items, list):
+                    continue
+                added, changed, removed = syncState.diff(resource, items)
+                reportSync(toTitle(resource), added, changed, removed)
+                syncState.commit(resource, items)
+
+            syncState.save()
+
+        def saveResources():
+            syncResources()
+
+            cached_resources = [
+                ('collectors', 'collectors', data.collectors, 'Collectors'),
+                ('exports', 'queries', data.savedQueries, 'Personal Folder queries'),
+                ('fers', 'fers', data.fers, 'FERs'),
+                ('partitions', 'partitions', data.partitions, 'Partitions Indecies'),
+                ('svs', 'views', data.views, 'Scheduled Views'),
+                ('roles', 'roles', data.roles, 'Roles'),
+                ('users', 'users', data.users, 'Users')]
+
+            for resource, table, items, title in cached_resources:
+                if resource not in fetchedResources:
+                    continue
+
+                store.save(table, items)
+
+                update_connection_loading_wip('\n - {num} {title} cached!\n'.format(num=len(items), title=title))
 
-                if 'category' in collector.keys() \
-                    and collector['category'] \
-                        not in ST.source_categories:
-                    ST.source_categories.append(
-                        collector['category'])
-                    if saveRawJsonMeta:
-                        update_connection_loading_wip('\n --- Category[{sc_name}]'.format(sc_name=collector['category']))
-                    total_sources += 1
+        def afterAllDataHasLoaded(saveRawJsonMeta=False):
+            if saveRawJsonMeta:
+                with ST.load_connection_data_lock:
+                    if not ownsStore():
+                        # the connection was switched while this data was loading
+                        return
+                    saveResources()
 
-                if 'sources' in collector.keys():
-                    for source in collector['sources']:
-                        if 'name' in source.keys() \
-                            and source['name'] \
-                                not in ST.sources_names:
-                            ST.sources_names.append(
-                                source['name'])
-                            if saveRawJsonMeta:
-                                update_connection_loading_wip('\n --- Source[{src_name}]'.format(src_name=source['name']))
-                        if 'category' in source.keys() \
-                            and source['category'] \
-                                not in ST.source_categories:
-                            ST.source_categories.append(
-                                source['category'])
-                            if saveRawJsonMeta:
-                                update_connection_loading_wip('\n ------ Category [{sc_name}]'.format(sc_name=source['category']))
-                                total_sources += 1
+            data.collectors_names, data.sources_names, data.source_categories, total_sources = \
+                indexCollectorNames(data.collectors.values())
 
-            update_connection_loading_wip('\n - {num} Source Categories Loaded!\n'.format(num=total_sources))
+            update_connection_loading_wip('\n - {collectors} Collectors, {sources} Sources ({names} distinct), {categories} Source Categories Indexed!\n'.format(
+                collectors=len(data.collectors), sources=total_sources,
+                names=len(data.sources_names), categories=len(data.source_categories)))
 
-            sv_index_names = [view['indexName'] for view in ST.views]
-            part_index_names = [partition['name'] for partition in ST.partitions]
+            sv_index_names = [view['indexName'] for view in data.views]
+            part_index_names = [partition['name'] for partition in data.partitions]
 
             update_connection_loading_wip('\n - Loading Completions...\n')
-            ST.completion = Completion(
-                ST.collectors_names, ST.sources_names,
-                ST.source_categories, part_index_names,
-                sv_index_names, ST.fers, SUMOLOGIC_COMPLETIONS,
-                settings=settingsStore)
+            completion = Completion(
+                data.collectors_names, data.sources_names,
+                data.source_categories, part_index_names,
+                sv_index_names, data.fers, SUMOLOGIC_COMPLETIONS,
+                settings=settingsStore, history=historyStore)
 
-            ST.ready = True
+            if not ST.swapConnectionData(conn, data, completion):
+                return
 
             update_connection_loading_wip('\n\n - All Completions Loaded...\n')
+
+            for resource_name, retries in conn.sumo.getRetryCounts().items():
+                update_connection_loading_wip(' - {num} Retries for {resource_name}\n'.format(num=retries, resource_name=resource_name))
+
             update_connection_loading_wip('\n - DONE!\n')
 
-            time.sleep(5)
+            if background:
+                Window().status_message('{0}: Connection data refreshed'.format(__package__))
+                return
+
+            refreshStaleData()
 
-            Window().run_command("hide_panel", {"panel": "output." + 'Logs'})
+            sublime.set_timeout(lambda: Window().run_command(
+                "hide_panel", {"panel": "output." + 'Logs'}), 5000)
 
         def processCollectors(collectors=None, params=None, saveRawJsonMeta=True):
-            print('we are in processCollectors')
-            print('the objectsLoaded is {objectsLoaded}'.format(objectsLoaded=objectsLoaded))
             items = collectors
             if items and len(items)==1 and 'errors' in items[0].keys():
 
@@ -660,86 +858,101 @@ class ST(EventListener):
 
                 update_connection_loading_wip('\n{err}\n'.format(err=error['msg']))
                 ST.items = items
-                ST.load_connection_data_stats['collectors'] = True
-                if ST.check_connection_data_progress():
-                    afterAllDataHasLoaded(saveRawJsonMeta)
+                loadFailed('collectors')
+                markLoaded('sources', False)
                 return
 
+            nonlocal collectorOffset
             loaded = 'Loaded' if saveRawJsonMeta else 'Loaded From Cache'
 
             update_connection_loading_wip(' - {num} Collectors {Loaded}\n'.format(Loaded=loaded, num=len(collectors)))
 
             if saveRawJsonMeta:
                 if items and len(items) >= 50:
-                    ST.collector_offset += 50
+                    collectorOffset += 50
                     if params:
                         request_params = params['request_params']
 
                         if request_params:
-                            request_params['offset'] = ST.collector_offset
+                            request_params['offset'] = collectorOffset
                             request_params['limit'] = 50
                         else:
-                            request_params = {'offset': ST.collector_offset, 'limit': 50}
+                            request_params = {'offset': collectorOffset, 'limit': 50}
                 else:
                     params['request_params'] = None
-                    ST.load_connection_data_stats['collectors'] = True
 
                 collectors_dict = None
                 collectors_dict = {collector['id']:collector for collector in collectors}
-                ST.load_connection_data_stats['sources'].update({collector['id']:False for collector in collectors})
 
-                ST.collectors.update(collectors_dict)
+                data.collectors.update(collectors_dict)
 
                 if params:
                     if 'request_params' in params:
                         request_params = params['request_params']
                         if request_params and 'offset' in request_params.keys():
-                            time.sleep(0.6)
-                            update_connection_loading_wip(' - Getting the next {offset} Collectors..'.format(offset=ST.collector_offset))
-                            ST.conn.getCollectors(callback=collectorsCallback, params=params)
+                            update_connection_loading_wip(' - Getting the next {offset} Collectors..'.format(offset=collectorOffset))
+                            conn.getCollectors(callback=collectorsCallback, params=params)
                         else:
-                            for k in ST.load_connection_data_stats['sources'].keys():
-                                if k not in ST.collectors.keys():
-                                    print('forcing')
-                                    print(k)
-                                    ST.load_connection_data_stats['sources'][k]=True
-
-                            for id, collector in ST.collectors.items():
-                                ST.load_connection_data_stats['sources'][id] = True
-
-                                def sourcesCallback(sources, params=None):
-                                    try:
-                                        items = sources
-                                        if items and len(items)==1 and 'errors' in items[0].keys():
-                                            print(id)
-                                            ST.load_connection_data_stats['sources'][id] = True
-                                            error = items[0]
-                                            update_connection_loading_wip('\n{err}\n'.format(err=error['msg']))
-                                            ST.items = items
-                                            return
-
-                                        collector['sources'] = sources
-                                        update_connection_loading_wip(
-                                            'Adding {num} Sources for Collector [{collector_name}]\n'.
-                                            format(num=len(sources), collector_name=collector['name']))
-                                    except Exception as e:
-                                            update_connection_loading_wip('\n{err}\n'.format(err=str(e)))
-
-                                time.sleep(0.6)
-
-                                ST.conn.getSources(id,
-                                                   params=None,
-                                                   callback=sourcesCallback)
+                            markLoaded('collectors', saveRawJsonMeta)
+                            fetchAllSources(saveRawJsonMeta)
 
             else:
-                ST.load_connection_data_stats['collectors'] = True
-                ST.collectors = None
-                ST.collectors = copy.deepcopy(collectors)
+                data.collectors = collectors
+                markLoaded('collectors', saveRawJsonMeta)
+                markLoaded('sources', saveRawJsonMeta)
+
+        def fetchAllSources(saveRawJsonMeta=True):
+            collectors = dict(data.collectors)
+            collector_ids = list(collectors.keys())
+
+            added, changed, removed = syncState.diff('collectors', collectors.values())
+            reportSync('Collectors', added, changed, removed)
+            fingerprints = syncState.fingerprints('collectors')
+            syncState.commit('collectors', collectors.values())
+            syncState.retain('sources', collector_ids)
+
+            if incremental:
+                modified = set(added + changed)
+                collector_ids = []
+                for collector_id, collector in collectors.items():
+                    cached = cachedCollectors.get(str(collector_id))
+                    stale = time.time() - syncState.touchedAt('sources', collector_id) > sourcesSyncTtl
+                    if str(collector_id) in modified or stale or not cached or 'sources' not in cached:
+                        collector_ids.append(collector_id)
+                    else:
+                        collector['sources'] = cached['sources']
+
+            update_connection_loading_wip(' - Getting Sources for {num} Collectors..\n'.format(num=len(collector_ids)))
+
+            def onSourcesProgress(done, total):
+                update_connection_loading_wip(' - Sources fetched for {done}/{total} Collectors\n'.format(done=done, total=total))
+
+            def onAllSources(sources, errors):
+                total_sources = 0
+                for collector_id, collector_sources in sources.items():
+                    collectors[collector_id]['sources'] = collector_sources
+                    total_sources += len(collector_sources)
+
+                syncState.touch('sources', sources.keys())
+
+                # a failed collector keeps its cached sources, and the
+                # fingerprint it had, so the next refresh fetches it again
+                for collector_id in errors:
+                    cached = cachedCollectors.get(str(collector_id))
+                    if cached and 'sources' in cached:
+                        collectors[collector_id]['sources'] = cached['sources']
+                syncState.restore('collectors', errors.keys(), fingerprints)
+
+                for error in errors.values():
+                    update_connection_loading_wip('\n{err}\n'.format(err=error['msg']))
+
+                update_connection_loading_wip(' - {num} Sources Loaded for {collectors} Collectors ({failed} failed)\n'.format(
+                    num=total_sources, collectors=len(sources), failed=len(errors)))
 
-            pprint(ST.load_connection_data_stats)
+                markLoaded('sources', saveRawJsonMeta)
 
-            if ST.check_connection_data_progress():
-                afterAllDataHasLoaded(saveRawJsonMeta)
+            conn.getAllSources(collector_ids, callback=onAllSources,
+                                  progress=onSourcesProgress)
 
         def collectorsCallback(collectors, params=None):
             processCollectors(collectors=collectors, params=params)
@@ -752,37 +965,30 @@ class ST(EventListener):
 
                 update_connection_loading_wip('\n{err}\n'.format(err=error['msg']))
                 ST.items = items
-                ST.load_connection_data_stats['fers'] = True
-
-                if ST.check_connection_data_progress():
-                    afterAllDataHasLoaded(saveRawJsonMeta)
+                loadFailed('fers')
                 return
 
             loaded = 'Loaded' if saveRawJsonMeta else 'Loaded From Cache'
 
-            if ST.fers and len(ST.fers) > 0:
-                ST.fers += fers
+            if data.fers and len(data.fers) > 0:
+                data.fers += fers
 
             else:
-                ST.fers = fers
+                data.fers = fers
 
             if params:
                 if 'request_params' in params:
                     request_params = params['request_params']
                     if request_params and 'token' in request_params.keys():
                         next_token = request_params['token']
-                        time.sleep(0.6)
                         update_connection_loading_wip(' - Getting FERs Views next batch {next}\n'.format(next=next_token))
 
-                        ST.conn.getFERs(callback=fersCallback, params=params)
-
-                ST.load_connection_data_stats['fers'] = True
+                        conn.getFERs(callback=fersCallback, params=params)
+                        return
 
+            update_connection_loading_wip(' - {num} FERs {Loaded}...\n'.format(Loaded=loaded, num=len(data.fers)))
 
-            update_connection_loading_wip(' - {num} FERs {Loaded}...\n'.format(Loaded=loaded, num=len(ST.fers)))
-
-            if ST.check_connection_data_progress():
-                    afterAllDataHasLoaded(saveRawJsonMeta)
+            markLoaded('fers', saveRawJsonMeta)
 
         def fersCallback(fers, params=None):
             processFERs(fers=fers, params=params)
@@ -795,39 +1001,34 @@ class ST(EventListener):
 
                 update_connection_loading_wip('\n{err}\n'.format(err=error['msg']))
                 ST.items = items
-                ST.load_connection_data_stats['roles'] = True
-
-                if ST.check_connection_data_progress():
-                    afterAllDataHasLoaded(saveRawJsonMeta)
+                loadFailed('roles')
                 return
 
             loaded = 'Loaded' if saveRawJsonMeta else 'Loaded From Cache'
 
-            if ST.roles and len(ST.roles) > 0:
-                ST.roles += roles
+            if data.roles and len(data.roles) > 0:
+                data.roles += roles
 
             else:
-                ST.roles = roles
+                data.roles = roles
 
             for role in roles:
-                ST.role_lookup[role['id']]= {'name': role['name'],
+                data.role_lookup[role['id']]= {'name': role['name'],
                 'capabilities': role['capabilities']}
 
-            update_connection_loading_wip(' - {num} Roles {Loaded}...\n'.format(Loaded=loaded, num=len(ST.roles)))
+            update_connection_loading_wip(' - {num} Roles {Loaded}...\n'.format(Loaded=loaded, num=len(data.roles)))
 
             if params:
                 if 'request_params' in params:
                     request_params = params['request_params']
                     if request_params and 'token' in request_params.keys():
                         next_token = request_params['token']
-                        time.sleep(0.6)
                         update_connection_loading_wip(' - Getting Roles next batch {next}\n'.format(next=next_token))
 
-                        ST.conn.getRoles(callback=rolesCallback, params=params)
-            ST.load_connection_data_stats['roles'] = True
+                        conn.getRoles(callback=rolesCallback, params=params)
+                        return
 
-            if ST.check_connection_data_progress():
-                afterAllDataHasLoaded(saveRawJsonMeta)
+            markLoaded('roles', saveRawJsonMeta)
 
         def rolesCallback(roles, params=None):
             processRoles(roles=roles, params=params)
@@ -840,35 +1041,30 @@ class ST(EventListener):
 
                 update_connection_loading_wip('\n{err}\n'.format(err=error['msg']))
                 ST.items = items
-                ST.load_connection_data_stats['users'] = True
-
-                if ST.check_connection_data_progress():
-                    afterAllDataHasLoaded(saveRawJsonMeta)
+                loadFailed('users')
                 return
 
             loaded = 'Loaded' if saveRawJsonMeta else 'Loaded From Cache'
 
-            if ST.users and len(ST.users) > 0:
-                ST.users += users
+            if data.users and len(data.users) > 0:
+                data.users += users
 
             else:
-                ST.users = users
+                data.users = users
 
-            update_connection_loading_wip(' - {num} Users {Loaded}...\n'.format(Loaded=loaded, num=len(ST.users)))
+            update_connection_loading_wip(' - {num} Users {Loaded}...\n'.format(Loaded=loaded, num=len(data.users)))
 
             if params:
                 if 'request_params' in params:
                     request_params = params['request_params']
                     if request_params and 'token' in request_params.keys():
                         next_token = request_params['token']
-                        time.sleep(0.6)
                         update_connection_loading_wip(' - Getting Users next batch {next}\n'.format(next=next_token))
 
-                        ST.conn.getUsers(callback=usersCallback, params=params)
-            ST.load_connection_data_stats['users'] = True
+                        conn.getUsers(callback=usersCallback, params=params)
+                        return
 
-            if ST.check_connection_data_progress():
-                afterAllDataHasLoaded(saveRawJsonMeta)
+            markLoaded('users', saveRawJsonMeta)
 
         def usersCallback(users, params=None):
             processUsers(users=users, params=params)
@@ -880,11 +1076,11 @@ class ST(EventListener):
 
             if status == 'Success':
                 params['uri_id'] = '{uri_id}/result'.format(uri_id=ST.contentExportJobId)
-                ST.conn.getContentExportJob(callback=contentExportJobResult,params=params)
+                conn.getContentExportJob(callback=contentExportJobResult,params=params)
             elif status == 'InProgress':
                 params['uri_id'] = '{uri_id}/status'.format(uri_id=ST.contentExportJobId)
                 time.sleep(1)
-                ST.conn.getContentExportJob(callback=contentExportJobStatus, params=params)
+                conn.getContentExportJob(callback=contentExportJobStatus, params=params)
 
         def flatten_json(y):
             print('Personal JSON Coplex\n')
@@ -914,12 +1110,9 @@ class ST(EventListener):
 
             if cached_queries and not saveRawJsonMeta:
                update_connection_loading_wip(' - {num} Personal Folder Contents {Loaded}...\n'.format(Loaded=loaded, num=len(cached_queries)))
-               ST.savedQueries = cached_queries
-               ST.load_connection_data_stats['exports'] = True
-
-               if ST.check_connection_data_progress():
-                    afterAllDataHasLoaded(saveRawJsonMeta)
+               data.savedQueries = cached_queries
                ST.folderTypeWIP = None
+               markLoaded('exports', saveRawJsonMeta)
                return
 
             panels_queries = {}
@@ -973,17 +1166,14 @@ class ST(EventListener):
             all_queries.update(panels_queries)
             all_queries.update(saved_queries)
 
-            ST.savedQueries = all_queries
+            data.savedQueries = all_queries
 
             if ST.folderTypeWIP == 'personal' and 'personal' not \
                 in ST.foldersProcessed:
                 ST.foldersProcessed.append('personal')
-            ST.load_connection_data_stats['exports'] = True
-
-            if ST.check_connection_data_progress():
-                afterAllDataHasLoaded(saveRawJsonMeta)
 
             ST.folderTypeWIP = None
+            markLoaded('exports', saveRawJsonMeta)
 
         def contentExportJobResult(contentExportJobStatusJson, params=None):
             processContentExportJobResult(contentExportJobStatusJson=contentExportJobStatusJson, params=params)
@@ -995,7 +1185,7 @@ class ST(EventListener):
             params['uri_name'] = 'export'
             params['uri_id'] = '{uri_id}/status'.format(uri_id=ST.contentExportJobId)
 
-            ST.conn.getContentExportJob(callback=contentExportJobStatus,params=params)
+            conn.getContentExportJob(callback=contentExportJobStatus,params=params)
 
         def onFolderInfoReceivedCallback(folderInfoJson, params=None):
             ST.folderTypeWIP = params['request_params']['folder_type']
@@ -1007,85 +1197,114 @@ class ST(EventListener):
                 params['parent_uri_id'] = ST.contentId
                 params['uri_name'] = 'export'
                 params['uri_id'] = None
-                ST.conn.startContentExportJob(callback=getContentExportJobId, params=params)
+                conn.startContentExportJob(callback=getContentExportJobId, params=params)
             else:
                 raise(Exception('blow'))
 
         def processPartitions(partitions=None, params=None, saveRawJsonMeta=True):
+            items = partitions
+            if items and len(items)==1 and 'errors' in items[0].keys():
 
-            loaded = 'Loaded' if saveRawJsonMeta else 'Loaded From Cache'
-            ST.partitions = partitions
+                error = items[0]
+
+                update_connection_loading_wip('\n{err}\n'.format(err=error['msg']))
+                ST.items = items
+                loadFailed('partitions')
+                return
 
-            update_connection_loading_wip(' - {num} Partitions Indecies {Loaded}...\n'.format(Loaded=loaded, num=len(ST.partitions)))
-            ST.load_connection_data_stats['partitions'] = True
+            loaded = 'Loaded' if saveRawJsonMeta else 'Loaded From Cache'
+            data.partitions = partitions
 
-            if ST.check_connection_data_progress():
-                afterAllDataHasLoaded(saveRawJsonMeta)
+            update_connection_loading_wip(' - {num} Partitions Indecies {Loaded}...\n'.format(Loaded=loaded, num=len(data.partitions)))
+            markLoaded('partitions', saveRawJsonMeta)
 
         def partitionsCallback(partitions, params=None):
             processPartitions(partitions=partitions, params=params)
 
         def processScheduledViews(views=None, params=None, saveRawJsonMeta=True):
+            items = views
+            if items and len(items)==1 and 'errors' in items[0].keys():
+
+                error = items[0]
+
+                update_connection_loading_wip('\n{err}\n'.format(err=error['msg']))
+                ST.items = items
+                loadFailed('svs')
+                return
+
             loaded = 'Loaded' if saveRawJsonMeta else 'Loaded From Cache'
 
-            if ST.views and len(ST.views) > 0:
-                ST.views += views
+            if data.views and len(data.views) > 0:
+                data.views += views
 
             else:
-                ST.views = views
+                data.views = views
 
             if params:
                 if 'request_params' in params:
                     request_params = params['request_params']
                     if request_params and 'token' in request_params.keys():
                         next_token = request_params['token']
-                        time.sleep(0.6)
                         update_connection_loading_wip(' - Getting Scheduled Views next batch {next}\n'.format(next=next_token))
 
-                        ST.conn.getScheduledViews(callback=scheduledViewsCallback, params=params)
-            ST.load_connection_data_stats['svs'] = True
-            update_connection_loading_wip(' - {num} Scheduled Views {Loaded}...\n'.format(Loaded=loaded, num=len(ST.views)))
+                        conn.getScheduledViews(callback=scheduledViewsCallback, params=params)
+                        return
 
-            if ST.check_connection_data_progress():
-                    afterAllDataHasLoaded(saveRawJsonMeta)
+            update_connection_loading_wip(' - {num} Scheduled Views {Loaded}...\n'.format(Loaded=loaded, num=len(data.views)))
+            markLoaded('svs', saveRawJsonMeta)
 
         def scheduledViewsCallback(views, params=None):
             processScheduledViews(views=views, params=params)
 
-        current_connection_metadata_collectors =\
-            parseRawJson(os.path.join(
-                                  ST.current_connection_metadata_folder,
-                                  'collectors'))
-
-        current_connection_metadata_queries =\
-            parseRawJson(os.path.join(
-                                  ST.current_connection_metadata_folder,
-                                  'queries'))
-
-        current_connection_metadata_fers =\
-            parseRawJson(os.path.join(
-                                  ST.current_connection_metadata_folder,
-                                  'fers'))
-
-        current_connection_metadata_partitions =\
-            parseRawJson(os.path.join(
-                                  ST.current_connection_metadata_folder,
-                                  'partitions'))
-
-        current_connection_metadata_views =\
-            parseRawJson(os.path.join(
-                                  ST.current_connection_metadata_folder,
-                                  'views'))
-
-        current_connection_metadata_users =\
-            parseRawJson(os.path.join(
-                                  ST.current_connection_metadata_folder,
-                                  'users'))
-
-        current_connection_metadata_roles =\
-            parseRawJson(os.path.join(
-                                  ST.current_connection_metadata_folder,
-                                  'roles'))
+        with ST.load_connection_data_lock:
+            if not ownsStore():
+                return
+
+            syncState = SyncState(store)
+
+            current_connection_metadata_collectors = store.load('collectors')
+
+            current_connection_metadata_queries = store.load('queries')
+
+            current_connection_metadata_fers = store.load('fers')
+
+            current_connection_metadata_partitions = store.load('partitions')
+
+            current_connection_metadata_views = store.load('views')
+
+            current_connection_metadata_users = store.load('users')
+
+            current_connection_metadata_roles = store.load('roles')
+
+        if incremental or full:
+            # a full reload fetches everything, the cached copy is only
+            # served for what fails to load
+            refresh = set(resources) if resources and not full \
+                else set(REFRESHABLE_METADATA)
+            cachedCollectors = {str(collector_id): collector for collector_id, collector in
+                                (current_connection_metadata_collectors or {}).items()}
+            cachedMetadata = {'collectors': current_connection_metadata_collectors,
+                              'fers': current_connection_metadata_fers,
+                              'partitions': current_connection_metadata_partitions,
+                              'svs': current_connection_metadata_views,
+                              'roles': current_connection_metadata_roles,
+                              'users': current_connection_metadata_users}
+            cachedMetadata = {resource: items for resource, items in cachedMetadata.items() if items}
+
+            if 'collectors' in refresh:
+                current_connection_metadata_collectors = None
+            if 'fers' in refresh:
+                current_connection_metadata_fers = None
+            if 'partitions' in refresh:
+                current_connection_metadata_partitions = None
+            if 'svs' in refresh:
+                current_connection_metadata_views = None
+            if 'roles' in refresh:
+                current_connection_metadata_roles = None
+            if 'users' in refresh:
+                current_connection_metadata_users = None
+            if full:
+                current_connection_metadata_queries = None
 
         if current_connection_metadata_collectors:
             processCollectors(
@@ -1093,13 +1312,13 @@ class ST(EventListener):
                 saveRawJsonMeta=False, params=None)
 
         else:
-            ST.conn.getCollectors(callback=collectorsCallback, params={"request_params": {'offset': 0, 'limit': 50}})
+            conn.getCollectors(callback=collectorsCallback, params={"request_params": {'offset': 0, 'limit': 50}})
 
         if current_connection_metadata_queries:
             processContentExportJobResult(cached_queries=current_connection_metadata_queries, params=None,saveRawJsonMeta=False)
 
         else:
-            ST.conn.getFolder(
+            conn.getFolder(
                 callback=onFolderInfoReceivedCallback,
                 params={"request_params":{'folder_type': 'personal'}})
 
@@ -1107,32 +1326,32 @@ class ST(EventListener):
             processFERs(fers=current_connection_metadata_fers, params=None, saveRawJsonMeta=False)
 
         else:
-            ST.conn.getFERs(callback=fersCallback, params=None)
+            conn.getFERs(callback=fersCallback, params=None)
 
         if current_connection_metadata_partitions:
             processPartitions(partitions=current_connection_metadata_partitions, params=None, saveRawJsonMeta=False)
         else:
-            ST.conn.getPartitions(callback=partitionsCallback, params=None)
+            conn.getPartitions(callback=partitionsCallback, params=None)
 
         if current_connection_metadata_views:
             processScheduledViews(views=current_connection_metadata_views, params=None, saveRawJsonMeta=False)
 
         else:
-            ST.conn.getScheduledViews(
+            conn.getScheduledViews(
                 callback=scheduledViewsCallback, params=None)
 
         if current_connection_metadata_roles:
             processRoles(roles=current_connection_metadata_roles, params=None, saveRawJsonMeta=False)
 
         else:
-            ST.conn.getRoles(
+            conn.getRoles(
                 callback=rolesCallback, params={"request_params": {"sortBy": "name"}})
 
         if current_connection_metadata_users:
             processUsers(users=current_connection_metadata_users, params=None, saveRawJsonMeta=False)
 
         else:
-            ST.conn.getUsers(
+            conn.getUsers(
                 callback=usersCallback, params={"request_params": {"sortBy": "firstName"}})
 
     @staticmethod
@@ -1196,7 +1415,6 @@ class ST(EventListener):
                  callback=lambda: Window().run_command(
                                           'st_show_all_collectors'))
 
-        collectors = []
         show_results = createOutput(
                                      name="{0}_{1}".format
                                      (
@@ -1204,12 +1422,8 @@ class ST(EventListener):
                                      ),
                                      syntax=SYNTAX_Sumo)
 
-        for collector in ST.collectors.values():
-            if 'sources' in collector.keys():
-                collector.pop('sources', None)
-            collectors.append(collector)
-
-        collectors = list(ST.collectors.values())
+        collectors = list(ST.metadata_store.loadCollectors(
+                                                withSources=False).values())
         show_results(get_formatted_results(
             results_format=ST.results_format,json_raw_data=collectors))
 
@@ -1312,18 +1526,10 @@ class ST(EventListener):
                                          ST.conn.accessId, ' - All_Sources'
                                      ),
                                      syntax=SYNTAX_Sumo)
-        sources = []
-
-        for collector in ST.collectors.values():
-            if 'sources' in collector.keys():
-                sources.append(collector['sources'])
-
-
-        flatten = lambda l: [item for sublist in l for item in sublist]
-        flattened_sources = flatten(sources)
+        sources = ST.metadata_store.load('sources')
 
         show_results(get_formatted_results(
-            results_format=ST.results_format, json_raw_data=flattened_sources))
+            results_format=ST.results_format, json_raw_data=sources))
 
     @staticmethod
     def showScheduledViewQuery(callback=None):
@@ -1425,7 +1631,7 @@ class ST(EventListener):
                             'Latex': 'latex', 'Latex Raw': 'latex_raw',
                             'Latex Booktabs': 'latex_booktabs',
                             'Textile': 'textile', 'Json': 'json_pretty',
-                            'CSV': 'csv'}
+                            'CSV': 'csv', 'SQLite': 'sqlite'}
         menu = [str(key) for key in formats.keys()]
 
         def onFormatSelected(index, callback):
@@ -1453,92 +1659,94 @@ class ST(EventListener):
                                   onTimeZoneSelected(index))
 
     @staticmethod
-    def selectResultsMessagesPageQuickPanel():
-        page_size = 250
-        message_count = ST.message_count
-        results_pages = OrderedDict()
-        total = message_count
-        left_over = 0
-        pages = 0
+    def jobsFolder():
+        return os.path.join(ST.current_connection_metadata_folder, 'jobs')
+
+    @staticmethod
+    def openResultSpool(job_id, kind):
+        if ST.result_spool:
+            ST.result_spool.close()
+        ST.result_spool = ResultSpool(ST.jobsFolder(), job_id, kind)
+        return ST.result_spool
 
-        if total > 0:
-            left_over = message_count % page_size
-            deviadable = total - left_over
-            deviadable = deviadable if deviadable > 0 else 0
-            pages = int(deviadable / page_size)
+    @staticmethod
+    def resultsPages(total, label, page_size=250):
+        results_pages = OrderedDict()
 
-        for page in range (1, pages+1):
-            end = page * page_size
-            start = end - (page_size - 1)
-            key = "Page {page}, Messages [{start} - {end}]".format(page=page, start=start, end=end)
-            results_pages[key] = {'offset': start-1, 'limit': page_size}
+        if total > page_size:
+            key = "All {label} [1 - {end}]".format(label=label, end=total)
+            results_pages[key] = {'fetch_all': True}
 
-        lo_start = ((pages*page_size) + 1)
-        lo_end = ((pages*page_size) + left_over)
-        lo_key = "Page {page}, Messages [{start} - {end}]".format(page=pages+1,
-            start=lo_start, end=lo_end)
+        for page, offset in enumerate(range(0, total, page_size), 1):
+            limit = min(page_size, total - offset)
+            key = "Page {page}, {label} [{start} - {end}]".format(
+                page=page, label=label, start=offset + 1, end=offset + limit)
+            results_pages[key] = {'offset': offset, 'limit': limit}
 
-        results_pages[lo_key] = {'offset': lo_start-1, 'limit': lo_end}
+        return results_pages
 
+    @staticmethod
+    def selectResultsMessagesPageQuickPanel():
+        page_size = settingsStore.get('results_page_size', 250)
+        results_pages = ST.resultsPages(ST.message_count, 'Messages', page_size)
         menu = list(results_pages.keys())
 
         def onResultsMessagesPageSelected(index):
-            results_pages_key = menu[index]
-            results_page = results_pages[results_pages_key]
+            if index < 0 or ST.message_count <= 0:
+                return
+
+            results_page = results_pages[menu[index]]
+            job_id = ST.search_job_id
+
+            if results_page.get('fetch_all'):
+                ST.conn.get_job_messages(params={"results_format": ST.results_format,
+                        "sqlite_indexes": settingsStore.get('sqlite_export_indexes', [])},
+                     job_id=job_id, fetchAll=True, total=ST.message_count,
+                     spool=ST.openResultSpool(job_id, 'messages'),
+                     callback=createOutput(
+                        name="Job {job_id} - All Messages".format(job_id=job_id)))
+                return
+
             offset = results_page['offset']
             limit = results_page['limit']
             end = offset + limit
 
-            if ST.message_count > 0:
-                ST.conn.get_job_messages(params={"results_format": "csv", "request_params":{'offset':offset, 'limit': limit}},
-                     job_id=ST.search_job_id, callback=createOutput(
-                        name="Job {job_id} - Messages [{start} - {end}]".format(job_id=ST.search_job_id, start=offset, end=end)))
+            ST.conn.get_job_messages(params={"results_format": "csv", "request_params":{'offset':offset, 'limit': limit}},
+                 job_id=job_id, callback=createOutput(
+                    name="Job {job_id} - Messages [{start} - {end}]".format(job_id=job_id, start=offset, end=end)))
 
         Window().show_quick_panel(menu, lambda index:
                                   onResultsMessagesPageSelected(index))
 
     @staticmethod
     def selectResultsRecordsPageQuickPanel():
-        page_size = 250
-        record_count = ST.record_count
-        results_pages = OrderedDict()
-        total = record_count
-        left_over = 0
-        pages = 0
-
-        if total > 0:
-            left_over = record_count % page_size
-            deviadable = total - left_over
-            deviadable = deviadable if deviadable > 0 else 0
-            pages = int(deviadable / page_size)
-
-        for page in range (1, pages+1):
-            end = page * page_size
-            start = end - (page_size-1)
-            key = "Page {page}, Records [{start} - {end}]".format(page=page, start=start, end=end)
-            results_pages[key] = {'offset': start-1, 'limit': page_size}
+        page_size = settingsStore.get('results_page_size', 250)
+        results_pages = ST.resultsPages(ST.record_count, 'Records', page_size)
+        menu = list(results_pages.keys())
 
-        lo_start = ((pages*page_size) + 1)
-        lo_end = ((pages*page_size) + left_over)
-        lo_key = "Page {page}, Records [{start} - {end}]".format(page=pages+1,
-            start=lo_start, end=lo_end)
+        def onResultsRecordsPageSelected(index):
+            if index < 0 or ST.record_count <= 0:
+                return
 
-        results_pages[lo_key] = {'offset': lo_start-1, 'limit': lo_end}
+            results_page = results_pages[menu[index]]
+            job_id = ST.search_job_id
 
-        menu = list(results_pages.keys())
+            if results_page.get('fetch_all'):
+                ST.conn.get_job_records(params={"results_format": ST.results_format,
+                        "sqlite_indexes": settingsStore.get('sqlite_export_indexes', [])},
+                     job_id=job_id, fetchAll=True, total=ST.record_count,
+                     spool=ST.openResultSpool(job_id, 'records'),
+                     callback=createOutput(
+                        name="Job {job_id} - All Records".format(job_id=job_id)))
+                return
 
-        def onResultsRecordsPageSelected(index):
-            results_pages_key = menu[index]
-            results_page = results_pages[results_pages_key]
             offset = results_page['offset']
             limit = results_page['limit']
             end = offset + limit
 
-
-            if ST.record_count > 0:
-                ST.conn.get_job_records(params={"results_format": ST.results_format},
-                         job_id=ST.search_job_id, callback=createOutput(
-                            name="Job {job_id} - Records [{start} - {end}]".format(job_id=ST.search_job_id, start=offset, end=end)))
+            ST.conn.get_job_records(params={"results_format": ST.results_format, "request_params": {'offset': offset, 'limit': limit}},
+                     job_id=job_id, callback=createOutput(
+                        name="Job {job_id} - Records [{start} - {end}]".format(job_id=job_id, start=offset, end=end)))
 
         Window().show_quick_panel(menu, lambda index:
                                   onResultsRecordsPageSelected(index))
@@ -1597,7 +1805,23 @@ class ST(EventListener):
                 'Your select Sumo instance has no source categories!')
             return
 
-        ST.showQuickPanelWithSelection(ST.source_categories, callback)
+        def onCategorySelected(index):
+            if index < 0:
+                return
+            category = ST.source_categories[index]
+            sources = ST.metadata_store.sourcesByCategory(category)
+            if not sources:
+                Window().status_message(
+                    'No sources found for {0}'.format(category))
+                return
+            show_results = createOutput(
+                name="{0}_{1}".format(ST.conn.accessId, category),
+                syntax=SYNTAX_Sumo)
+            show_results(get_formatted_results(
+                results_format=ST.results_format, json_raw_data=sources))
+
+        ST.showQuickPanelWithSelection(ST.source_categories,
+                                       callback or onCategorySelected)
 
     @staticmethod
     def showQuickPanelWithSelection(arrayOfValues, callback):
@@ -1840,10 +2064,13 @@ class StShowSourceCategories(WindowCommand):
 
 class StRefreshConnectionData(WindowCommand):
     @staticmethod
-    def run():
+    def run(incremental=True):
         if not ST.conn:
             return
-        ST.loadConnectionData()
+        # incremental=False is the full reload, past the metadata store
+        commandExecutor.submit(
+            lambda: ST.loadConnectionData(incremental=incremental,
+                                          full=not incremental))
 
 
 class StExecuteAll(WindowCommand):
@@ -1953,17 +2180,202 @@ class StExecuteAll(WindowCommand):
             ("+" + "-*-+" * 35) + "-+\n")
 
     @staticmethod
-    def run(fromTime=None, toTime=None):
+    def showSpool(spool, title):
+        """ renders a spooled result page by page, without a search job """
+        if ST.result_spool and ST.result_spool is not spool:
+            ST.result_spool.close()
+        ST.result_spool = spool
+        # the spool, not an earlier job, is now the last result
+        ST.search_job_id = None
+
+        results_format = ST.results_format if spool.kind == 'records' \
+            else 'csv'
+        page_size = settingsStore.get('results_page_size', 250)
+
+        def render():
+            output = createOutput(name=title)
+            if spool.partial:
+                output('-- partial result, the fetch stopped after {rows} '
+                       'rows\n'.format(rows=len(spool)))
+            if not len(spool):
+                return
+
+            if results_format in STREAMING_FORMATS:
+                # widths from a first pass, so the whole spool is one table
+                table = TableWriter(results_format, title=columnTitle)
+                for _, rows in spool.pages(page_size):
+                    table.measure(rows)
+                output(table.header())
+                for _, rows in spool.pages(page_size):
+                    output(table.rows(rows))
+                output(table.footer())
+                return
+
+            if results_format == 'csv':
+                # one file for the whole spool
+                with CsvWriter(Convertor.csv_file_path()) as writer:
+                    for _, rows in spool.pages(page_size):
+                        output(writer.write(rows))
+                Convertor.open_file(writer.path)
+                return
+
+            if results_format == 'sqlite':
+                export = SqliteExport(
+                    Convertor.sqlite_file_path(), table=spool.kind,
+                    indexes=settingsStore.get('sqlite_export_indexes', []))
+                try:
+                    for _, rows in spool.pages(page_size):
+                        export.write(rows)
+                    output(export.summary(export.finish()))
+                except Exception:
+                    export.abort()
+                    raise
+                return
+
+            for offset, rows in spool.pages(page_size):
+                output(get_formatted_results(root=spool.kind,
+                                             results_format=results_format,
+                                             json_raw_data=rows,
+                                             offset=offset) or '')
+
+        commandExecutor.submit(render)
+
+    @staticmethod
+    def cacheJobResults(query, fromTime, toTime, job_id, kind, total):
+        """ keeps a small finished result around for re-runs of the same
+        query and window """
+        cache, conn = ST.result_cache, ST.conn
+        if not cache or not cache.ttl or total <= 0 or \
+                total > settingsStore.get('result_cache_max_rows', 10000):
+            return
+
+        def fill():
+            spool = cache.newSpool(kind)
+            try:
+                for _, rows in conn.iter_job_results(job_id, kind, total):
+                    spool.append(rows)
+                spool.finish(query=query, fromTime=fromTime, toTime=toTime)
+                spool.close()
+                cache.put(conn.name, query, fromTime, toTime, spool)
+            except Exception:
+                logger.exception('Failed to cache results of job %s', job_id)
+                spool.delete()
+
+        commandExecutor.submit(fill, key=conn.name)
+
+    @staticmethod
+    def runTail(query, fromTime, toTime, entry):
+        """ searches only past the end of a cached window and merges the
+        new messages with the cached ones still inside [fromTime, toTime] """
+        cache, conn = ST.result_cache, ST.conn
+        update_tail_wip = createOutput(
+            name='Cached Search Status', syntax=SYNTAX_Sumo,
+            show_result_on_window_rt=False)
+        update_tail_wip(
+            "| Reusing {rows} cached Messages, searching the last {secs}s only\n"
+            .format(rows=entry['rows'],
+                    secs=(toTime - entry['toTime']) // 1000))
+
+        def on_results(results, fields, errors):
+            if errors:
+                for error in errors:
+                    for err in (error if isinstance(error, list) else [error]):
+                        update_tail_wip('\n{err}\n'.format(
+                            err=err.get('msg', err) if isinstance(err, dict)
+                            else err))
+                return
+
+            cached = cache.spool(entry)
+            try:
+                kept = [row for _, rows in cached.pages(10000) for row in rows
+                        if messageTime(row) >= fromTime]
+            finally:
+                cached.close()
+
+            merged = mergeMessages([results, kept],
+                                   AggregationPlan(query).limit)
+            update_tail_wip('\n - {new} new and {kept} cached Messages merged\n'
+                            .format(new=len(results), kept=len(kept)))
+
+            spool = cache.newSpool('messages')
+            spool.append(merged, fields=fields or cached.fields)
+            spool.finish(query=query, fromTime=fromTime, toTime=toTime)
+            cache.put(conn.name, query, fromTime, toTime, spool)
+            StExecuteAll.showSpool(spool, 'Cached Search - Messages')
+
+        ShardedSearch(conn, jobPoller, query, entry['toTime'], toTime,
+                      callback=on_results, shards=1).start()
+
+    @staticmethod
+    def runSharded(query, fromTime, toTime, shards, plan):
+        ofmt = "%d/%m/%Y %H:%M:%S"
+        update_sharded_wip = createOutput(
+            name='Sharded Search Status', syntax=SYNTAX_Sumo,
+            show_result_on_window_rt=False)
+
+        update_sharded_wip(
+            "| Running {shards} time slices, {jobs} jobs at a time\n".format(
+                shards=shards,
+                jobs=settingsStore.get('search_max_concurrent_jobs', 4)))
+
+        def on_progress(shard, finished, total):
+            status = 'failed' if shard.error is not None else \
+                '{num} {kind}'.format(
+                    num=len(shard.records if plan.aggregate else shard.messages),
+                    kind='Records' if plan.aggregate else 'Messages')
+            update_sharded_wip(
+                "| {finished}/{total} Slice [{fromTime} - {toTime}] {status}\n".format(
+                    finished=finished, total=total, status=status,
+                    fromTime=get_tz_specifc_time(shard.fromTime, ofmt=ofmt),
+                    toTime=get_tz_specifc_time(shard.toTime, ofmt=ofmt)))
+
+        def on_results(results, fields, errors):
+            for error in errors:
+                for err in (error if isinstance(error, list) else [error]):
+                    update_sharded_wip('\n{err}\n'.format(
+                        err=err.get('msg', err) if isinstance(err, dict) else err))
+
+            kind = 'Records' if plan.aggregate else 'Messages'
+            update_sharded_wip('\n - {num} {kind} merged\n'.format(
+                num=len(results), kind=kind))
+
+            if not results:
+                return
+
+            spool = ST.openResultSpool('sharded-{ts}'.format(
+                ts=int(time.time() * 1000)), kind.lower())
+            spool.append(results, fields=fields)
+            spool.finish(query=query, fromTime=fromTime, toTime=toTime)
+            ST.search_job_id = None
+            if ST.result_cache and ST.result_cache.ttl:
+                ST.result_cache.put(ST.conn.name, query, fromTime, toTime,
+                                    spool)
+
+            results_format = ST.results_format if plan.aggregate else 'csv'
+            createOutput(name='Sharded Search - {kind}'.format(kind=kind))(
+                get_formatted_results(root=kind.lower(),
+                                      results_format=results_format,
+                                      json_raw_data=results))
+
+        ShardedSearch(ST.conn, jobPoller, query, fromTime, toTime,
+                      callback=on_results, shards=shards,
+                      maxJobs=settingsStore.get('search_max_concurrent_jobs', 4),
+                      progress=on_progress).start()
+
+    @staticmethod
+    def run(fromTime=None, toTime=None, shards=None):
         if not ST.conn:
             ST.selectConnectionQuickPanel(callback=lambda:
                                           Window().run_command(
-                                                'st_execute_all'))
+                                                'st_execute_all',
+                                                {'shards': shards}))
 
         if not ST.results_format:
             ST.selectResultsFormatQuickPanel(callback=lambda
                                          :
                                           Window().run_command(
-                                                'st_execute_all'))
+                                                'st_execute_all',
+                                                {'shards': shards}))
 
         if not fromTime:
             ST.selectTimeWindowQuickPanel(callback=lambda
@@ -1971,33 +2383,21 @@ class StExecuteAll(WindowCommand):
                                           Window().run_command(
                                                 'st_execute_all',
                                                 {'fromTime': fromTime,
-                                                    'toTime': toTime}))
+                                                    'toTime': toTime,
+                                                    'shards': shards}))
             return
         Window().status_message(MESSAGE_RUNNING_CMD)
 
-        def get_status(outputContent, params):
-            ST.search_job_id = None
-            ST.message_count = 0
-            ST.record_count = 0
-            message_count = outputContent['messageCount']
-            record_count = outputContent.get('recordCount', 0)
-            job_id = params['uri_id']
-            state = outputContent['state']
-            state_msg = '| ' + state
-
-            StExecuteAll.update_connection_loading_wip = createOutput(
-                name="Job {job_id} Status".format(job_id=job_id),
-                syntax=SYNTAX_Sumo, show_result_on_window_rt=False)
+        lastProgress = {}
 
-            StExecuteAll.update_connection_loading_wip(
-                ("+" + "-*-+" * 35) + "-+\n")
+        def get_status(outputContent, job_id):
+            if not isinstance(outputContent, dict) or 'state' not in outputContent:
+                return
 
-            StExecuteAll.update_connection_loading_wip(
-                "{state_msg}{postfix}|\n".format(
-                    state_msg=state_msg,
-                    postfix=(" " * (142 - (len(state_msg))))))
+            state = outputContent['state']
+            state_msg = '| ' + state
 
-            histogram_buckets = outputContent['histogramBuckets']
+            histogram_buckets = outputContent.get('histogramBuckets', [])
 
             max_start_ts = max([histogram_bucket.get('startTimestamp', 0)
                                for histogram_bucket in histogram_buckets]) \
@@ -2010,36 +2410,67 @@ class StExecuteAll(WindowCommand):
                 and "error" not in outputContent
 
             wip = round(((max_start_ts - min_start_ts)
-                         / (toTime - fromTime))*100)
+                         / max(toTime - fromTime, 1))*100)
 
             wip = wip if query_incomplete else 100
 
+            # the panel is kept, only a change of state or progress is written
+            if lastProgress.get(job_id) == (state, wip):
+                return
+            lastProgress[job_id] = (state, wip)
+
+            StExecuteAll.update_connection_loading_wip(
+                "{state_msg}{postfix}|\n".format(
+                    state_msg=state_msg,
+                    postfix=(" " * (142 - (len(state_msg))))))
+
             StExecuteAll.update_connection_loading_wip(
                         printProgressBar(wip, 100, suffix='\n', length=141))
 
-            if(query_incomplete):
-                time.sleep(1)
-                ST.conn.search_job_polling(
-                   params={'uri_id': job_id}, callback=get_status)
-            else:
-                StExecuteAll.populate_status(
-                                     job_id, outputContent, fromTime, toTime)
+        def on_job_done(outputContent, job_id):
+            ST.search_job_id = None
+            ST.message_count = 0
+            ST.record_count = 0
+
+            if not isinstance(outputContent, dict) or 'state' not in outputContent:
+                errors = outputContent if isinstance(outputContent, list) else [outputContent]
+                for error in errors:
+                    message = error.get('msg', error) if isinstance(error, dict) else error
+                    StExecuteAll.update_connection_loading_wip('\n{err}\n'.format(err=message))
+                return
 
-                ST.search_job_id = job_id
-                ST.message_count = message_count
-                ST.record_count = record_count
+            message_count = outputContent['messageCount']
+            record_count = outputContent.get('recordCount', 0)
 
-                if message_count > 0 or record_count > 0:
-                    if record_count > 0:
-                        Window().run_command("st_select_results_records_page")
-                    elif message_count > 0:
-                        Window().run_command("st_select_results_messages_page")
+            StExecuteAll.populate_status(
+                                 job_id, outputContent, fromTime, toTime)
 
-                time.sleep(10)
+            ST.search_job_id = job_id
+            ST.message_count = message_count
+            ST.record_count = record_count
+
+            if plan.aggregate:
+                StExecuteAll.cacheJobResults(allText2, fromTime, toTime,
+                                             job_id, 'records', record_count)
+            else:
+                StExecuteAll.cacheJobResults(allText2, fromTime, toTime,
+                                             job_id, 'messages', message_count)
 
-                Window().run_command("hide_panel", {"panel": "output." + StExecuteAll.results_panel_name})
+            if message_count > 0 or record_count > 0:
+                if record_count > 0:
+                    Window().run_command("st_select_results_records_page")
+                elif message_count > 0:
+                    Window().run_command("st_select_results_messages_page")
+
+            panel_name = StExecuteAll.results_panel_name
+            sublime.set_timeout(lambda: Window().run_command(
+                "hide_panel", {"panel": "output." + panel_name}), 10000)
 
         def get_job_id(outputContent, params):
+            if not isinstance(outputContent, dict) or 'id' not in outputContent:
+                on_job_done(outputContent, None)
+                return
+
             job_id = outputContent['id']
             StExecuteAll.results_panel_name = "Job {job_id} Status".format(job_id=job_id)
             StExecuteAll.update_connection_loading_wip = createOutput(
@@ -2048,20 +2479,139 @@ class StExecuteAll(WindowCommand):
 
             StExecuteAll.update_connection_loading_wip(
                 ("|" + "+-*-" * 35) + "+|\n")
-            ST.conn.search_job_polling(params={
-                    'uri_id': job_id
-                    }, callback=get_status)
+            StExecuteAll.update_connection_loading_wip(
+                ("+" + "-*-+" * 35) + "-+\n")
+
+            jobPoller.watch(ST.conn, job_id, onStatus=get_status,
+                            onDone=on_job_done)
 
         allText = View().substr(sublime.Region(0, View().size()))
 
         allText2 = ''.join([x for x in allText if x in string.printable])
 
+        historyStore.add(allText2)
+
+        plan = AggregationPlan(allText2)
+        kind = 'records' if plan.aggregate else 'messages'
+        cache = ST.result_cache
+        if cache and cache.ttl:
+            entry = cache.get(ST.conn.name, allText2, fromTime, toTime, kind)
+            if entry:
+                Window().status_message(
+                    '{0}: {1} {2} served from the result cache'.format(
+                        __package__, entry['rows'], kind))
+                return StExecuteAll.showSpool(
+                    cache.spool(entry), 'Cached Search - {kind}'.format(
+                        kind=kind.capitalize()))
+
+            # a raw search has no aggregation to redo, only the tail past
+            # the cached window needs a new job
+            entry = None if plan.aggregate or not plan.mergeable else \
+                cache.overlap(ST.conn.name, allText2, fromTime, toTime, kind)
+            if entry:
+                return StExecuteAll.runTail(allText2, fromTime, toTime, entry)
+
+        shards = shards or settingsStore.get('search_shards', 1)
+        if shards > 1:
+            if plan.mergeable:
+                return StExecuteAll.runSharded(allText2, fromTime, toTime,
+                                               shards, plan)
+            Window().status_message(
+                '{0}: {1}, running as a single search job'.format(
+                    __package__, plan.reason))
+
         ST.conn.execute(params={"request_params":
                         {'query': allText2,
                             'from': fromTime,
                             'to': toTime}}, callback=get_job_id)
 
 
+class StLocalQuery(WindowCommand):
+    pipeline = 'where _count > 0 | sort by _count desc | top 10'
+    loaded = (None, None)
+
+    @staticmethod
+    def load(spool):
+        """ the spool as a ColumnarResult, kept until the spool changes """
+        key = (spool.folder, spool.kind, len(spool))
+        if StLocalQuery.loaded[0] != key:
+            result = ColumnarResult(spool.fields and [
+                field['name'] if isinstance(field, dict) else field
+                for field in spool.fields])
+            for _, rows in spool.pages(10000):
+                result.extend(rows)
+            StLocalQuery.loaded = (key, result)
+        return StLocalQuery.loaded[1]
+
+    @staticmethod
+    def source():
+        """ the spool of the last result, the last job's results are
+        fetched into one the first time """
+        spool, job_id = ST.result_spool, ST.search_job_id
+        if spool and spool.complete and job_id in (None, spool.job_id):
+            return spool
+        if not job_id:
+            return None
+
+        kind = 'records' if ST.record_count > 0 else 'messages'
+        total = ST.record_count or ST.message_count
+        spool = ST.openResultSpool(job_id, kind)
+        if not spool.complete:
+            spool.clear()
+            for _, rows in ST.conn.iter_job_results(job_id, kind, total):
+                spool.append(rows)
+            spool.finish(total=total)
+        return spool
+
+    @staticmethod
+    def execute(text):
+        StLocalQuery.pipeline = text
+        try:
+            pipeline = LocalPipeline(text)
+        except PipelineError as e:
+            Window().status_message('{0}: {1}'.format(__package__, e))
+            return
+
+        spool = StLocalQuery.source()
+        if spool is None:
+            Window().status_message(
+                '{0}: run a search first, there is no result to query'.format(
+                    __package__))
+            return
+
+        started = time.time()
+        try:
+            result = pipeline.run(StLocalQuery.load(spool))
+        except PipelineError as e:
+            Window().status_message('{0}: {1}'.format(__package__, e))
+            return
+
+        Window().status_message('{0}: {1} rows in {2:.0f} ms'.format(
+            __package__, len(result), (time.time() - started) * 1000))
+        createOutput(name='Local Query - {kind}'.format(
+            kind=spool.kind.capitalize()))(
+            get_formatted_results(root=spool.kind,
+                                  results_format=ST.results_format or 'grid',
+                                  json_raw_data=result.toRows()) or '')
+
+    @staticmethod
+    def run(pipeline=None):
+        if not ST.conn:
+            ST.selectConnectionQuickPanel(callback=lambda:
+                                          Window().run_command(
+                                              'st_local_query'))
+            return
+
+        def on_done(text):
+            commandExecutor.submit(lambda: StLocalQuery.execute(text))
+
+        if pipeline:
+            return on_done(pipeline)
+
+        Window().show_input_panel('Local Pipeline', StLocalQuery.pipeline,
+                                  on_done, None, None)
+
+
 class StVersion(WindowCommand):
     @staticmethod
     def run():
@@ -2145,11 +2695,23 @@ def reload():
     try:
         import imp
         imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Table"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Columnar"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Pipeline"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Export"])
         imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Utils"])
         imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Completion"])
         imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Storage"])
         imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.History"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Executor"])
         imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Command"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.JobPoller"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Sharded"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Spool"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.ResultCache"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Bulk"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.MetadataStore"])
+        imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Sync"])
         imp.reload(sys.modules[__package__ + ".SumoSwissKnifeAPI.Connection"])
     except Exception as e:
         raise (e)
@@ -2181,6 +2743,12 @@ def plugin_loaded():
 
 
 def plugin_unloaded():
+    if jobPoller:
+        jobPoller.shutdown()
+
+    if commandExecutor:
+        commandExecutor.shutdown()
+
     if plugin_logger.handlers:
         plugin_logger.handlers.pop()
 
@@ -0,0 +1,151 @@
+__version__ = "v0.0.1"
+
+import logging
+from collections import deque
+from threading import Lock, Thread, Condition
+
+logger = logging.getLogger(__name__)
+
+
+def isErrorResult(result):
+    return isinstance(result, list) and len(result) == 1 and \
+        isinstance(result[0], dict) and 'errors' in result[0].keys()
+
+
+class BulkFetch(object):
+    """ fans out fetch(key, callback) calls keeping at most `limit` in flight,
+    results are collected per key and handed over once all are done """
+
+    def __init__(self, keys, fetch, callback, progress=None, limit=4,
+                 progressEvery=50):
+        self.keys = deque(keys)
+        self.total = len(self.keys)
+        self.fetch = fetch
+        self.callback = callback
+        self.progress = progress
+        self.limit = max(1, limit)
+        self.progressEvery = max(1, progressEvery)
+        self.results = {}
+        self.errors = {}
+        self.done = 0
+        self.inFlight = 0
+        self.lock = Lock()
+
+    def start(self):
+        if self.total == 0:
+            self.callback(self.results, self.errors)
+            return
+
+        for _ in range(min(self.limit, self.total)):
+            self._fetchNext()
+
+    def _fetchNext(self):
+        with self.lock:
+            if not self.keys:
+                return
+            key = self.keys.popleft()
+            self.inFlight += 1
+
+        try:
+            self.fetch(key, lambda result, key=key: self._onResult(key, result))
+        except Exception as e:
+            logger.exception('Bulk fetch of {0} failed'.format(key))
+            self._onResult(key, [{'errors': [], 'msg': str(e)}])
+
+    def _onResult(self, key, result):
+        with self.lock:
+            if isErrorResult(result):
+                self.errors[key] = result[0]
+            else:
+                self.results[key] = result
+            self.done += 1
+            self.inFlight -= 1
+            done = self.done
+            finished = done == self.total
+
+        if self.progress and (finished or done % self.progressEvery == 0):
+            self.progress(done, self.total)
+
+        if finished:
+            self.callback(self.results, self.errors)
+        else:
+            self._fetchNext()
+
+
+class PageIterator(object):
+    """ iterates the pages of an offset/limit resource in order, fetching up to
+    `concurrency` pages ahead and never more than `window` unconsumed ones """
+
+    def __init__(self, fetch, total, pageSize=10000, concurrency=3,
+                 window=None):
+        self.fetch = fetch
+        self.pages = [(offset, min(pageSize, total - offset))
+                      for offset in range(0, max(total, 0), max(1, pageSize))]
+        self.concurrency = max(1, min(concurrency, len(self.pages) or 1))
+        self.window = max(self.concurrency, window or self.concurrency * 2)
+        self.scheduled = 0
+        self.consumed = 0
+        self.done = {}
+        self.closed = False
+        self.started = False
+        self.condition = Condition()
+
+    def __len__(self):
+        return len(self.pages)
+
+    def _start(self):
+        self.started = True
+        for idx in range(self.concurrency):
+            worker = Thread(target=self._work,
+                            name='SumoSwissKnife-Pages-{0}'.format(idx))
+            worker.daemon = True
+            worker.start()
+
+    def _work(self):
+        while True:
+            with self.condition:
+                # backpressure, wait for the consumer to catch up
+                while not self.closed and self.scheduled < len(self.pages) \
+                        and self.scheduled - self.consumed >= self.window:
+                    self.condition.wait()
+                if self.closed or self.scheduled >= len(self.pages):
+                    return
+                page = self.scheduled
+                self.scheduled += 1
+
+            offset, limit = self.pages[page]
+            try:
+                result = (self.fetch(offset, limit), None)
+            except Exception as e:
+                logger.exception('Fetching page at offset {0} failed'.format(
+                    offset))
+                result = (None, e)
+
+            with self.condition:
+                self.done[page] = result
+                self.condition.notify_all()
+
+    def __iter__(self):
+        if not self.started:
+            self._start()
+
+        try:
+            for page in range(len(self.pages)):
+                with self.condition:
+                    while page not in self.done:
+                        self.condition.wait()
+                    rows, error = self.done.pop(page)
+                    self.consumed = page + 1
+                    self.condition.notify_all()
+
+                if error is not None:
+                    raise error
+                yield self.pages[page][0], rows
+        finally:
+            self.close()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.done.clear()
+            self.condition.notify_all()
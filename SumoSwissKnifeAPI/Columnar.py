@@ -0,0 +1,343 @@
+__version__ = "v0.0.1"
+
+import re
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+INT = re.compile(r'^-?(0|[1-9]\d{0,17})$')
+KINDS = ('int', 'float', 'str')
+# integers a float still holds exactly
+EXACT = 2 ** 53
+
+MISSING = object()
+
+
+def _number(value, kind):
+    """ the value as an int or float if it prints back as the same text,
+    MISSING for an empty one, None when it isn't such a number """
+    if value is None or value == '':
+        return MISSING
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        value = repr(value)
+    elif not isinstance(value, str):
+        return None
+
+    if INT.match(value):
+        number = int(value)
+        if kind == 'int':
+            return number
+        return float(number) if abs(number) <= EXACT else None
+    if kind == 'int':
+        return None
+
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    # integral floats print without a fraction, so '2.0' stays a string
+    if number.is_integer() or repr(number) != value:
+        return None
+    return number
+
+
+class Column(object):
+    """ one field of a result, as a typed array of numbers or as codes into
+    a dictionary of its distinct strings """
+
+    def __init__(self, name, missing=0):
+        self.name = name
+        self.kind = 'int'
+        self.data = array('q')
+        # row -> None or '', for rows of a numeric column without a number
+        self.missing = {}
+        self.strings = []
+        self.codes = {}
+        self.extend([None] * missing)
+
+    def __len__(self):
+        return len(self.data)
+
+    def extend(self, values):
+        for kind in KINDS[KINDS.index(self.kind):-1]:
+            if kind == 'float' and self.kind == 'int' and \
+                    any(abs(number) > EXACT for number in self.data):
+                break
+            numbers = [_number(value, kind) for value in values]
+            if None not in numbers:
+                self._promote(kind)
+                base = len(self.data)
+                for idx, number in enumerate(numbers):
+                    if number is MISSING:
+                        self.missing[base + idx] = values[idx]
+                self.data.extend(0 if number is MISSING else number
+                                 for number in numbers)
+                return
+
+        self._promote('str')
+        self.data.extend(self._code(value) for value in values)
+
+    def _code(self, value):
+        if value is None:
+            return -1
+        if not isinstance(value, str):
+            value = str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def _promote(self, kind):
+        if kind == self.kind:
+            return
+        if kind == 'float':
+            self.data = array('d', self.data)
+        elif kind == 'str':
+            values = [self.value(idx) for idx in range(len(self.data))]
+            self.data = array('i')
+            self.missing = {}
+            self.data.extend(self._code(value) for value in values)
+        self.kind = kind
+
+    def value(self, idx):
+        """ the field's text in row idx, None when the row has none """
+        if self.kind == 'str':
+            code = self.data[idx]
+            return self.strings[code] if code >= 0 else None
+        if idx in self.missing:
+            return self.missing[idx]
+        value = self.data[idx]
+        if self.kind == 'float' and value.is_integer():
+            return str(int(value))
+        return repr(value)
+
+    def number(self, idx):
+        if self.kind == 'str' or idx in self.missing:
+            return None
+        return self.data[idx]
+
+    def numbers(self):
+        """ the values as a numpy array when available, missing ones as nan """
+        if self.kind == 'str':
+            return None
+        if numpy is None:
+            return self.data
+        values = numpy.array(self.data, dtype=float if self.missing
+                             else self.data.typecode)
+        if self.missing:
+            values[list(self.missing)] = numpy.nan
+        return values
+
+    def sortKeys(self):
+        """ a key per row which orders rows like the values, missing last """
+        if self.kind == 'str':
+            ranks = [0] * len(self.strings)
+            for rank, code in enumerate(sorted(range(len(self.strings)),
+                                               key=self.strings.__getitem__)):
+                ranks[code] = rank
+            return [(code < 0, ranks[code] if code >= 0 else 0)
+                    for code in self.data]
+        missing = self.missing
+        return [(idx in missing, value) for idx, value in
+                enumerate(self.data)]
+
+    def take(self, indexes):
+        column = Column(self.name)
+        column.kind = self.kind
+        column.strings = self.strings
+        column.codes = self.codes
+        column.data = array(self.data.typecode,
+                            (self.data[idx] for idx in indexes))
+        column.missing = dict((pos, self.missing[idx])
+                              for pos, idx in enumerate(indexes)
+                              if idx in self.missing) if self.missing else {}
+        return column
+
+
+class ColumnarResult(object):
+    """ messages or records of a kept result as one Column per field, for
+    local queries; toRows() gives back the {'map': {...}} rows the search
+    API returns """
+
+    def __init__(self, fields=None):
+        self.columns = OrderedDict()
+        self.count = 0
+        for name in fields or []:
+            self.columns[name] = Column(name)
+
+    @staticmethod
+    def fromRows(rows, fields=None):
+        result = ColumnarResult(fields)
+        result.extend(rows)
+        return result
+
+    def extend(self, rows):
+        maps = [row['map'] if 'map' in row and len(row) == 1 else row
+                for row in rows]
+        if not maps:
+            return
+
+        for row in maps:
+            for name in row:
+                if name not in self.columns:
+                    self.columns[name] = Column(name, missing=self.count)
+
+        for name, column in self.columns.items():
+            column.extend([row.get(name) for row in maps])
+        self.count += len(maps)
+
+    def __len__(self):
+        return self.count
+
+    def row(self, idx):
+        row = OrderedDict()
+        for name, column in self.columns.items():
+            value = column.value(idx)
+            if value is not None:
+                row[name] = value
+        return row
+
+    def __iter__(self):
+        for idx in range(self.count):
+            yield {'map': self.row(idx)}
+
+    def toRows(self):
+        return list(self)
+
+    def column(self, name):
+        return self.columns.get(name)
+
+    def order(self, name, desc=False):
+        """ row indexes sorted by a field, rows without it last """
+        column = self.columns.get(name)
+        if column is None:
+            return list(range(self.count))
+
+        if numpy is not None and column.kind != 'str' and not column.missing:
+            indexes = numpy.argsort(column.numbers(), kind='mergesort')
+            indexes = indexes[::-1] if desc else indexes
+            return indexes.tolist()
+
+        keys = column.sortKeys()
+        if not desc:
+            return sorted(range(self.count), key=keys.__getitem__)
+
+        # missing values still go last
+        present = [idx for idx in range(self.count) if not keys[idx][0]]
+        present.sort(key=lambda idx: keys[idx][1], reverse=True)
+        return present + [idx for idx in range(self.count) if keys[idx][0]]
+
+    def take(self, indexes):
+        indexes = list(indexes)
+        result = ColumnarResult()
+        for name, column in self.columns.items():
+            result.columns[name] = column.take(indexes)
+        result.count = len(indexes)
+        return result
+
+    def select(self, names):
+        """ the given fields only, sharing their columns """
+        result = ColumnarResult()
+        for name in names:
+            if name in self.columns:
+                result.columns[name] = self.columns[name]
+        result.count = self.count
+        return result
+
+    def sorted(self, name, desc=False):
+        return self.take(self.order(name, desc))
+
+    def groups(self, keys):
+        """ row indexes per distinct value of the key fields, first seen order """
+        columns = [self.columns.get(name) for name in keys]
+        groups = OrderedDict()
+        if not columns:
+            groups[()] = list(range(self.count))
+            return groups
+
+        for idx in range(self.count):
+            group = tuple(None if column is None else
+                          column.data[idx] if column.kind == 'str' else
+                          column.number(idx) for column in columns)
+            indexes = groups.get(group)
+            if indexes is None:
+                indexes = groups[group] = []
+            indexes.append(idx)
+        return groups
+
+    def aggregate(self, keys, aggregates):
+        """ one row per group of the key fields, aggregates given as
+        (operator, field, alias) with count, count_distinct, sum, min, max
+        or avg """
+        result = []
+        for indexes in self.groups(keys).values():
+            row = OrderedDict()
+            for name in keys:
+                column = self.columns.get(name)
+                value = column.value(indexes[0]) if column else None
+                row[name] = '' if value is None else value
+
+            for operator, field, alias in aggregates:
+                column = self.columns.get(field) if field else None
+                row[alias] = _aggregate(operator, column, indexes)
+            result.append(row)
+        return ColumnarResult.fromRows(result)
+
+
+def _numbers(column, indexes):
+    if column is None:
+        return []
+    if column.kind != 'str':
+        missing = column.missing
+        return [column.data[idx] for idx in indexes if idx not in missing]
+
+    numbers = []
+    for idx in indexes:
+        try:
+            numbers.append(float(column.value(idx)))
+        except (TypeError, ValueError):
+            pass
+    return numbers
+
+
+def _format(number):
+    if number is None:
+        return ''
+    return str(int(number)) if float(number).is_integer() else repr(number)
+
+
+def _aggregate(operator, column, indexes):
+    if operator == 'count':
+        if column is None:
+            return str(len(indexes))
+        return str(sum(1 for idx in indexes if column.value(idx) not in
+                       (None, '')))
+    if operator == 'count_distinct':
+        if column is None:
+            return '0'
+        if column.kind == 'str':
+            codes = set(column.data[idx] for idx in indexes)
+            return str(sum(1 for code in codes
+                           if code >= 0 and column.strings[code] != ''))
+        return str(len(set(column.data[idx] for idx in indexes
+                           if idx not in column.missing)))
+
+    numbers = _numbers(column, indexes)
+    if not numbers:
+        return ''
+    if operator == 'sum':
+        return _format(sum(numbers))
+    if operator == 'min':
+        return _format(min(numbers))
+    if operator == 'max':
+        return _format(max(numbers))
+    if operator == 'avg':
+        return _format(sum(numbers) / float(len(numbers)))
+    raise ValueError("unsupported aggregate '{0}'".format(operator))
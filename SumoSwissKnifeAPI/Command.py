@@ -109,6 +109,11 @@ class Command(object):
                 resultString = []
                 resultString.append(e.__dict__)
                 # sublime.error_message(e.msg)
+        except Exception as e:
+                # transport errors, or an error body which isn't JSON, still
+                # reach the callback, which may be waiting on this result
+                logger.exception('{0} failed'.format(self.api_call))
+                resultString = [{'errors': [], 'msg': str(e)}]
 
         self.callback(resultString, params=self.params)
 
@@ -129,7 +134,8 @@ class Command(object):
     @staticmethod
     def createAndRun(callback, sumo=None, api_call=None, params=None,
                      query=None, encoding='utf-8', options=None,
-                     timeout=15, silenceErrors=False):
+                     timeout=15, silenceErrors=False, executor=None,
+                     poolKey=None):
         if options is None:
             options = {}
 
@@ -141,10 +147,11 @@ class Command(object):
         command.run()
 
 
-class ThreadCommand(Command, Thread):
+class ThreadCommand(Command):
     def __init__(self, callback, sumo=None, api_call=None, params=None,
                  query=None, encoding='utf-8', options=None,
-                 timeout=Command.timeout, silenceErrors=False):
+                 timeout=Command.timeout, silenceErrors=False,
+                 executor=None, poolKey=None):
         if options is None:
             options = {}
 
@@ -152,17 +159,29 @@ class ThreadCommand(Command, Thread):
                          api_call=api_call, params=params,
                          query=query, encoding=encoding, options=options,
                          timeout=timeout, silenceErrors=silenceErrors)
-        Thread.__init__(self)
+        self.executor = executor
+        self.poolKey = poolKey
+
+    def start(self):
+        if self.executor:
+            self.executor.submit(self.run, key=self.poolKey)
+            return
+
+        thread = Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
 
     @staticmethod
     def createAndRun(callback, sumo=None, api_call=None, params=None,
                      query=None, encoding='utf-8', options=None,
-                     timeout=Command.timeout, silenceErrors=False):
+                     timeout=Command.timeout, silenceErrors=False,
+                     executor=None, poolKey=None):
         if options is None:
             options = {}
 
         command = ThreadCommand(callback=callback, sumo=sumo,
                                 api_call=api_call, params=params, query=query,
                                 encoding=encoding, options=options,
-                                timeout=timeout, silenceErrors=silenceErrors)
+                                timeout=timeout, silenceErrors=silenceErrors,
+                                executor=executor, poolKey=poolKey)
         command.start()
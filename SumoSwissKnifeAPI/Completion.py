@@ -1,7 +1,13 @@
 __version__ = "v0.0.1"
 
+import re
+import time
+import heapq
 import logging
-from collections import namedtuple
+from threading import Lock
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, Counter, OrderedDict
+import sublime
 from sublime import INHIBIT_WORD_COMPLETIONS, INHIBIT_EXPLICIT_COMPLETIONS
 import json
 
@@ -17,6 +23,40 @@ meta_fields = [
 
 logger = logging.getLogger(__name__)
 
+# ST4 only, asks for new completions as the prefix grows instead of
+# filtering the first (top-K) answer
+DYNAMIC_COMPLETIONS = getattr(sublime, 'DYNAMIC_COMPLETIONS', 0)
+
+COMPLETION_FLAGS = INHIBIT_WORD_COMPLETIONS | INHIBIT_EXPLICIT_COMPLETIONS \
+    | DYNAMIC_COMPLETIONS
+
+# the metadata value typed so far, it may hold non word chars like / or -
+TYPED_VALUE = re.compile(r'[^\s=()"\']*$')
+
+# path segments (a/b/c, a-b, a_b, a.b) and camelCase humps
+WORD_START = re.compile(r'(?<=[/_\-.:\s])[^/_\-.:\s]|(?<=[a-z0-9])[A-Z]')
+SEGMENT_SEPARATOR = re.compile(r'[/_\-.:\s]+')
+
+# _sourceCategory=prod/app*, as written in FER scopes and queries
+METADATA_CONSTRAINT = re.compile(r'(_[a-zA-Z]+)\s*=\s*("[^"]*"|[^\s()|"]+)')
+
+# metadata values used in past queries, for the frequency boost
+HISTORY_VALUE = re.compile(
+    r'(_sourceCategory|_collector|_sourceName|_view|_index)\s*=\s*'
+    r'("[^"]*"|[^\s()|"]+)', re.IGNORECASE)
+
+PREFIX_SCORE = 1000
+WORD_PREFIX_SCORE = 800
+ACRONYM_SCORE = 750
+SUBSTRING_SCORE = 600
+SUBSEQUENCE_SCORE = 300
+FREQUENCY_SCORE = 25
+
+# the substring and subsequence scan is a fallback, it gives up rather than
+# lag the popup
+SCAN_BUDGET = 0.002
+SCAN_CHUNK = 1 << 15
+
 
 def _stripPrefix(text, prefix):
     if text.startswith(prefix):
@@ -25,30 +65,346 @@ def _stripPrefix(text, prefix):
 
 
 class CompletionItem(namedtuple('CompletionItem', ['type', 'ident', 'contents'])):
+    pass
+
+
+def renderCompletion(item):
+    return ["{ident}\t({type})".format(ident=item.ident, type=item.type),
+            item.contents]
+
+
+class PrefixIndex(object):
+    """ case insensitive sorted array of pre-rendered completions """
+
+    def __init__(self, items):
+        entries = sorted((item.ident.lower(), renderCompletion(item))
+                         for item in items)
+        self.keys = [key for key, _ in entries]
+        self.completions = [completion for _, completion in entries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, prefix, limit=None):
+        if not prefix:
+            return self.completions[:limit]
+
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\uffff', start)
+        if limit:
+            end = min(end, start + limit)
+        return self.completions[start:end]
+
+
+def wordStarts(ident):
+    return [0] + [match.start() for match in WORD_START.finditer(ident)]
+
+
+def _subsequence(lowered, query, starts=None):
+    """ positions of query chars in lowered, at word starts when possible """
+    positions = []
+    pos = 0
+    for char in query:
+        at = lowered.find(char, pos)
+        if at == -1:
+            return None
+        if starts:
+            for start in starts:
+                if start >= pos and lowered[start] == char:
+                    at = start
+                    break
+        positions.append(at)
+        pos = at + 1
+    return positions
+
+
+def fuzzyScore(lowered, starts, query):
+    if lowered.startswith(query):
+        score = PREFIX_SCORE
+    elif any(lowered.startswith(query, start) for start in starts):
+        score = WORD_PREFIX_SCORE
+    elif query in lowered:
+        score = SUBSTRING_SCORE
+    else:
+        positions = _subsequence(lowered, query)
+        if positions is None:
+            return None
+        positions = _subsequence(lowered, query, starts) or positions
+
+        on_starts = len(set(positions).intersection(starts))
+        if on_starts == len(query):
+            score = ACRONYM_SCORE
+        else:
+            gaps = positions[-1] - positions[0] - len(positions) + 1
+            score = SUBSEQUENCE_SCORE + 40 * on_starts - min(gaps, 100)
+
+    # the shorter the closer
+    return score - min(len(lowered), 200) / 4.0
+
+
+def historyFrequency(queries):
+    frequency = Counter()
+    for query in queries:
+        for _, value in HISTORY_VALUE.findall(query):
+            frequency[value.strip('"').lower()] += 1
+    return frequency
+
+
+class FuzzyIndex(object):
+    """ ranked lookup on path segments, camelCase humps and subsequences """
+
+    def __init__(self, items):
+        self.completions = [renderCompletion(item) for item in items]
+        self.lowered = [item.ident.lower() for item in items]
+        self.starts = [wordStarts(item.ident) for item in items]
+        self.positions = {lowered: position for position, lowered
+                          in enumerate(self.lowered)}
+        self.alphabetical = sorted(range(len(self.lowered)),
+                                   key=self.lowered.__getitem__)
+        self.sorted = [self.lowered[position] for position in self.alphabetical]
+
+        # every word start suffix, so segment and hump prefixes are a bisect
+        entries = sorted((lowered[start:], position)
+                         for position, lowered in enumerate(self.lowered)
+                         for start in self.starts[position])
+        self.suffixes = [suffix for suffix, _ in entries]
+        self.suffixPositions = [position for _, position in entries]
+
+        # one line per item, subsequences are left to the regex engine
+        self.blob = '\n'.join(self.lowered)
+        self.offsets = []
+        offset = 0
+        for lowered in self.lowered:
+            self.offsets.append(offset)
+            offset += len(lowered) + 1
+
+    def __len__(self):
+        return len(self.lowered)
+
+    def _wordPrefixRange(self, query):
+        start = bisect_left(self.suffixes, query)
+        return start, bisect_right(self.suffixes, query + '\uffff', start)
+
+    def _prefixCandidates(self, query, candidates, cap):
+        # whole ident prefixes first, so many a/prod items can't crowd out
+        # prod/web when prod is typed
+        start = bisect_left(self.sorted, query)
+        end = bisect_right(self.sorted, query + '\uffff', start)
+        candidates.update(self.alphabetical[start:min(end, start + cap)])
+
+    def _wordPrefixCandidates(self, query, candidates, cap):
+        start, end = self._wordPrefixRange(query)
+        for position in self.suffixPositions[start:end]:
+            if len(candidates) >= cap:
+                break
+            candidates.add(position)
+
+    def _segmentCandidates(self, query, candidates, cap):
+        # prd/wb: every typed segment starts some segment of the item
+        parts = [part for part in SEGMENT_SEPARATOR.split(query) if part]
+        if len(parts) < 2:
+            return
+
+        ranges = sorted((self._wordPrefixRange(part), part) for part in parts)
+        ranges.sort(key=lambda entry: entry[0][1] - entry[0][0])
+        (start, end), _ = ranges[0]
+        found = 0
+        for position in set(self.suffixPositions[start:end]):
+            if position in candidates:
+                continue
+            lowered, starts = self.lowered[position], self.starts[position]
+            if all(any(lowered.startswith(part, at) for at in starts)
+                   for _, part in ranges[1:]):
+                candidates.add(position)
+                found += 1
+                if found >= cap:
+                    break
+
+    def _chunks(self, deadline):
+        # chunks end on a line, so the budget is checked between them
+        pos = 0
+        while pos < len(self.blob) and time.time() < deadline:
+            line = bisect_right(self.offsets, pos + SCAN_CHUNK)
+            endpos = self.offsets[line] if line < len(self.offsets) else len(self.blob)
+            yield pos, endpos
+            pos = endpos
+
+    def _scanCandidates(self, query, candidates, cap, deadline):
+        """ substring and subsequence matches in one pass over the blob, as
+        every substring match is a subsequence match too """
+        # a[^b\n]*b[^c\n]*c never backtracks, unlike lazy .*? gaps
+        pattern = re.compile(re.escape(query[0]) + ''.join(
+            '[^{0}\n]*{0}'.format(re.escape(char)) for char in query[1:]))
+        substrings, subsequences = [], []
+        for pos, endpos in self._chunks(deadline):
+            for match in pattern.finditer(self.blob, pos, endpos):
+                position = bisect_right(self.offsets, match.start()) - 1
+                if position in candidates:
+                    continue
+                if query in self.lowered[position]:
+                    substrings.append(position)
+                elif len(subsequences) < cap:
+                    subsequences.append(position)
+            if len(substrings) >= cap:
+                break
+
+        candidates.update(substrings[:cap])
+        if len(candidates) < cap:
+            candidates.update(subsequences[:cap - len(candidates)])
+
+    def lookup(self, query, limit=50, frequency=None):
+        query = query.lower().replace('*', '')
+        cap = max(limit * 3, 150)
+        candidates = set()
+
+        if frequency:
+            candidates.update(self.positions[value] for value in frequency
+                              if value in self.positions)
+
+        if not query:
+            candidates.update(self.alphabetical[:limit])
+        else:
+            self._prefixCandidates(query, candidates, cap)
+            self._wordPrefixCandidates(query, candidates, cap)
+            if len(candidates) < limit:
+                self._segmentCandidates(query, candidates, cap)
+            if len(candidates) < limit:
+                self._scanCandidates(query, candidates, cap,
+                                     time.time() + SCAN_BUDGET)
+
+        scored = []
+        for position in candidates:
+            lowered = self.lowered[position]
+            score = fuzzyScore(lowered, self.starts[position], query) \
+                if query else 0
+            if score is None:
+                continue
+            if frequency:
+                score += FREQUENCY_SCORE * min(frequency.get(lowered, 0), 10)
+            scored.append((score, -position))
+
+        return [self.completions[-position] for _, position in
+                heapq.nlargest(limit, scored)]
+
+
+def scopeConstraints(text):
+    return [(field.lower(), value.strip('"').lower())
+            for field, value in METADATA_CONSTRAINT.findall(text)]
+
+
+def wildcardPattern(value):
+    return re.compile('.*'.join(re.escape(part) for part in value.split('*'))
+                      + r'\Z')
+
+
+class ScopeIndex(object):
+    """ FER scopes by metadata constraint, matched once per query text """
+
+    def __init__(self, scopes):
+        self.exact = {}
+        self.wildcards = {}
+        self.values = {}
+        self.unscoped = []
+        self.unparsed = []
+        self.query = None
+        self.matched = []
+
+        for scope in scopes:
+            constraints = scopeConstraints(scope)
+            if not constraints:
+                if scope.strip() in ('', '*'):
+                    self.unscoped.append(scope)
+                else:
+                    self.unparsed.append(scope)
+
+            for field, value in constraints:
+                if '*' in value:
+                    self.wildcards.setdefault(field, []).append(
+                        (wildcardPattern(value), value.split('*')[0], scope))
+                else:
+                    self.exact.setdefault((field, value), []).append(scope)
+                    self.values.setdefault(field, []).append(value)
+
+    def _match(self, query):
+        matched = OrderedDict((scope, None) for scope in self.unscoped)
+
+        for field, value in scopeConstraints(query):
+            for scope in self.exact.get((field, value), ()):
+                matched[scope] = None
+            literal = value.split('*')[0]
+            for pattern, prefix, scope in self.wildcards.get(field, ()):
+                # two wildcards overlap when their literal heads do
+                if pattern.match(value) or ('*' in value and (
+                        literal.startswith(prefix) or prefix.startswith(literal))):
+                    matched[scope] = None
+            # prod/* covers the FERs scoped to prod/app
+            if '*' in value:
+                pattern = wildcardPattern(value)
+                for scopeValue in self.values.get(field, ()):
+                    if pattern.match(scopeValue):
+                        for scope in self.exact[(field, scopeValue)]:
+                            matched[scope] = None
+
+        for scope in self.unparsed:
+            if scope in query:
+                matched[scope] = None
+
+        return list(matched)
+
+    def match(self, query):
+        if query != self.query:
+            self.matched = self._match(query)
+            self.query = query
+        return self.matched
+
+
+class UserFieldCache(object):
+    """ user defined fields per view, re-extracted by the debounced refresh
+    once typing settled rather than on every completion """
+    views = {}
+    lock = Lock()
+
+    @staticmethod
+    def get(view):
+        """ the last built index, stale or not; only a view without one yet
+        is scanned here """
+        with UserFieldCache.lock:
+            cached = UserFieldCache.views.get(view.id())
+        if cached:
+            return cached[1]
+        return UserFieldCache.refresh(view)
 
-    def prefixMatchScore(self, view, start, search, exactly=False):
-        return view.match_score(start, 'source.sumo & entity.name.sourcecategory.sumo')
+    @staticmethod
+    def refresh(view, changeCount=None):
+        if changeCount is None:
+            changeCount = view.change_count()
+
+        fields = OrderedDict.fromkeys(
+            view.substr(region)
+            for region in view.find_by_selector('meta.field.user.sumo'))
+        index = PrefixIndex([CompletionItem('Fld', field, field)
+                             for field in fields if field])
 
-    def prefixMatchListScore(self, searchList, exactly=False):
-        for item in searchList:
-            score = self.prefixMatchScore(item, exactly)
-            if score:
-                return score
-        return 0
+        with UserFieldCache.lock:
+            UserFieldCache.views[view.id()] = (changeCount, index)
+        return index
 
     @staticmethod
-    def _stringMatched(target, search, exactly):
-        if exactly:
-            return target == search or search == ''
-        else:
-            if (len(search) == 1):
-                return target.startswith(search)
-            return search in target
+    def isCurrent(view):
+        with UserFieldCache.lock:
+            cached = UserFieldCache.views.get(view.id())
+        return bool(cached) and cached[0] == view.change_count()
+
+    @staticmethod
+    def discard(view):
+        with UserFieldCache.lock:
+            UserFieldCache.views.pop(view.id(), None)
 
 
 class Completion:
     def __init__(self, allCollectors, allSources,
-                 allCategories, allPartitions, allSVs, allFERs, completion_list,  settings=None):
+                 allCategories, allPartitions, allSVs, allFERs, completion_list,  settings=None, history=None):
         self.allCollectors = [CompletionItem(
             'Collector',
             clctr, clctr) for clctr in allCollectors]
@@ -91,52 +447,81 @@ class Completion:
         self.all_meta_fields = [CompletionItem('Meta',
                                            meta, contents) for meta, contents in combined_meta.items()]
 
-    def getCompletions(self, completionItems):
-
-        return ([["{ident}\t({type})".format(
-            ident=cat_comp_item.ident,
-            type=cat_comp_item.type),
-        cat_comp_item.contents] for
-            cat_comp_item in completionItems], INHIBIT_WORD_COMPLETIONS | INHIBIT_EXPLICIT_COMPLETIONS)
+        self.limit = settings.get('completions_limit', 200) if settings else 200
+
+        self.fuzzyLimit = settings.get('fuzzy_completions_limit', 50) if settings else 50
+        self.history = history
+        self.historyKey = None
+        self.frequency = None
+
+        self.collectorsIndex = FuzzyIndex(self.allCollectors)
+        self.sourcesIndex = FuzzyIndex(self.allSources)
+        self.categoriesIndex = FuzzyIndex(self.allCategories)
+        self.partitionsIndex = FuzzyIndex(self.allPartitions)
+        self.svsIndex = FuzzyIndex(self.allSVs)
+        self.metaIndex = PrefixIndex(self.all_meta_fields)
+        self.keywordsIndex = PrefixIndex(self.allKeywords)
+        self.fersIndex = {scope: PrefixIndex(items)
+                          for scope, items in self.allFERs_completions.items()}
+        self.scopeIndex = ScopeIndex(self.fersIndex.keys())
+
+    def lookup(self, prefix, *indexes):
+        completions = []
+        for index in indexes:
+            if not self.limit:
+                completions.extend(index.lookup(prefix))
+                continue
+            completions.extend(index.lookup(prefix, self.limit - len(completions)))
+            if len(completions) >= self.limit:
+                break
+        return (completions, COMPLETION_FLAGS)
+
+    def historyFrequency(self):
+        if not self.history:
+            return None
+
+        queries = self.history.all()
+        key = (len(queries), queries[0] if queries else None)
+        if key != self.historyKey:
+            self.frequency = historyFrequency(queries)
+            self.historyKey = key
+        return self.frequency
+
+    def rank(self, typed, index):
+        return (index.lookup(typed, self.fuzzyLimit, self.historyFrequency()),
+                COMPLETION_FLAGS)
 
     def getAutoCompleteList(self, view, start, locations, prefix, sumoQuery,
                             sumoQueryToCursor):
 
-        fers_completions = []
-
-        [fers_completions.extend(fers_completion_set) for scope, fers_completion_set in self.allFERs_completions.items() if scope in sumoQuery]
-
-        sumo_user_fields_regions = view.find_by_selector(
-            'meta.field.user.sumo')
-
-        sumo_user_fields = [view.substr(suf_region)
-                            for suf_region in sumo_user_fields_regions]
-
-        suf_completion_items = [CompletionItem(
-            'Fld', suf, suf) for suf in sumo_user_fields]
+        typed = TYPED_VALUE.search(sumoQueryToCursor or '').group(0) or prefix
 
         if view.match_selector(
                 locations[0], 'meta.constant.metadata.field._sourcecategory.value.sumo'):
-            return self.getCompletions(self.allCategories)
+            return self.rank(typed, self.categoriesIndex)
 
         if view.match_selector(
                 locations[0], 'meta.constant.metadata.field._collector.value.sumo'):
-            return self.getCompletions(self.allCollectors)
+            return self.rank(typed, self.collectorsIndex)
 
         if view.match_selector(
                 locations[0], 'meta.constant.metadata.field._sourceName.value.sumo'):
-            return self.getCompletions(self.allSources)
+            return self.rank(typed, self.sourcesIndex)
 
         if view.match_selector(
                 locations[0], 'meta.constant.metadata.field._view.value.sumo'):
-            return self.getCompletions(self.allSVs)
+            return self.rank(typed, self.svsIndex)
 
         if view.match_selector(
                 locations[0], 'meta.constant.metadata.field._index.value.sumo'):
-            return self.getCompletions(self.allPartitions)
+            return self.rank(typed, self.partitionsIndex)
 
         if view.match_selector(
                 locations[0], 'meta.function-call.sumo'):
-            return self.getCompletions(suf_completion_items + fers_completions + self.all_meta_fields)
+            suf_completion_items = UserFieldCache.get(view)
+
+            fers_indexes = [self.fersIndex[scope] for scope in self.scopeIndex.match(sumoQuery)]
+
+            return self.lookup(prefix, suf_completion_items, *(fers_indexes + [self.metaIndex]))
 
-        return self.getCompletions(self.all_meta_fields + self.allKeywords)
+        return self.lookup(prefix, self.metaIndex, self.keywordsIndex)
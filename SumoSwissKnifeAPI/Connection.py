@@ -2,8 +2,12 @@ __version__ = "v0.0.1"
 
 import logging
 from . import Command as C
-from .sumologic import SumoLogic
-from .Utils import merge_dicts
+from .sumologic import SumoLogic, RetryPolicy, SumoAPIException
+from .Utils import merge_dicts, get_formatted_results, columnTitle, \
+    CsvWriter, Convertor
+from .Table import TableWriter, STREAMING_FORMATS
+from .Export import SqliteExport
+from .Bulk import BulkFetch, PageIterator
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +24,7 @@ class Connection(object):
     timeout = None
     sumo = None
     collectors = None
+    executor = None
 
     def __init__(self, name, options, settings=None,
                  commandClass='ThreadCommand'):
@@ -38,9 +43,26 @@ class Connection(object):
 
         sumo_endpoint = self.getSumoAPIEndPoint()
 
-        self.sumo = SumoLogic(self.accessId, self.accessKey, sumo_endpoint)
+        self.sumo = SumoLogic(
+            self.accessId, self.accessKey, sumo_endpoint,
+            rateLimit=settings.get('api_rate_limit', 4),
+            maxConcurrent=settings.get('api_max_concurrent_requests', 10),
+            retryPolicy=RetryPolicy(
+                maxAttempts=settings.get('api_max_attempts', 4),
+                backoffBase=settings.get('api_retry_backoff', 0.5),
+                backoffMax=settings.get('api_retry_backoff_max', 30)),
+            poolSize=max(settings.get('worker_pool_size', 8),
+                         settings.get('api_max_concurrent_requests', 10)),
+            gzip=settings.get('api_gzip', True))
         self.Command = getattr(C, commandClass)
 
+        maxConcurrentRequests = options.get(
+            'max_concurrent_requests',
+            settings.get('max_concurrent_requests', None))
+
+        if self.executor:
+            self.executor.setKeyLimit(self.name, maxConcurrentRequests)
+
     def __str__(self):
         return self.name
 
@@ -62,7 +84,8 @@ class Connection(object):
                                   api_call=api_call, params=params,
                                   encoding=self.encoding,
                                   options={'show_query': self.show_query},
-                                  timeout=self.timeout, silenceErrors=False)
+                                  timeout=self.timeout, silenceErrors=False,
+                                  executor=self.executor, poolKey=self.name)
 
     def getCollectors(self, callback, params=None):
         local_params = {"uri_name": "collectors", "json_root": "collectors",
@@ -78,12 +101,26 @@ class Connection(object):
         self.runInternalNamedQueryCommand(api_call="get_resources",
                                           params= merge_dicts(slave=params, master=local_params),
                                           callback=callback)
+    def getAllSources(self, collector_ids, callback, progress=None,
+                      limit=None):
+        if not limit:
+            limit = self.executor.getKeyLimit(self.name) \
+                if self.executor else 4
+
+        def fetch(collector_id, onSources):
+            self.getSources(collector_id,
+                            callback=lambda sources, params=None:
+                            onSources(sources))
+
+        BulkFetch(collector_ids, fetch, callback, progress=progress,
+                  limit=limit).start()
+
     def getPartitions(self, callback, params=None):
         local_params = {"uri_name": "partitions",
                           "results_format": "json", "json_root": "data"}
 
         self.runInternalNamedQueryCommand(api_call="get_resources",
-                                          params=local_params,
+                                          params= merge_dicts(slave=params, master=local_params),
                                           callback=callback)
 
     def getUsers(self, callback, params=None):
@@ -99,7 +136,7 @@ class Connection(object):
                           "results_format": "json", "json_root": "data"}
 
         self.runInternalNamedQueryCommand(api_call="get_resources",
-                                          params=local_params,
+                                          params= merge_dicts(slave=params, master=local_params),
                                           callback=callback)
 
     def getScheduledViews(self, callback, params=None):
@@ -107,7 +144,7 @@ class Connection(object):
                           "results_format": "json", "json_root": "data"}
 
         self.runInternalNamedQueryCommand(api_call="get_resources",
-                                          params=local_params,
+                                          params= merge_dicts(slave=params, master=local_params),
                                           callback=callback)
 
     def getFolder(self, callback, params=None):
@@ -137,7 +174,7 @@ class Connection(object):
                           "results_format": "json", "json_root": "data"}
 
         self.runInternalNamedQueryCommand(api_call="get_resources",
-                                          params=local_params,
+                                          params= merge_dicts(slave=params, master=local_params),
                                           callback=callback)
 
     def getRestValues(self, api_call=None, params=None, callback=None):
@@ -146,7 +183,8 @@ class Connection(object):
                                   api_call=api_call, params=params,
                                   encoding=self.encoding,
                                   options={'show_query': self.show_query},
-                                  timeout=self.timeout, silenceErrors=False)
+                                  timeout=self.timeout, silenceErrors=False,
+                                  executor=self.executor, poolKey=self.name)
 
     def execute(self, callback,
                 params=None, stream=None):
@@ -157,7 +195,8 @@ class Connection(object):
                                   api_call="get_resources",
                                   params=merge_dicts(master=params, slave=local_params), encoding=self.encoding,
                                   options={'show_query': self.show_query},
-                                  timeout=self.timeout, silenceErrors=False)
+                                  timeout=self.timeout, silenceErrors=False,
+                                  executor=self.executor, poolKey=self.name)
 
     def search_job_polling(self, callback, params=None):
         local_params = {"uri_name": "search/jobs",
@@ -169,9 +208,120 @@ class Connection(object):
                                   params=merge_dicts(master=params, slave=local_params),
                                   encoding=self.encoding,
                                   options={'show_query': self.show_query},
-                                  timeout=self.timeout, silenceErrors=False)
+                                  timeout=self.timeout, silenceErrors=False,
+                                  executor=self.executor, poolKey=self.name)
+
+    def iter_job_results(self, job_id, kind, total, pageSize=10000,
+                         concurrency=None):
+        """ (offset, rows) pages of a search job's messages or records, in order """
+        if not concurrency:
+            concurrency = self.executor.getKeyLimit(self.name) \
+                if self.executor else 4
+
+        def fetch(offset, limit):
+            page = self.sumo.get_resources(
+                method='get', parent_uri_name='search/jobs',
+                parent_uri_id=job_id, uri_name=kind, json_root=None,
+                request_params={'offset': offset, 'limit': limit})
+            return page.get(kind, [])
+
+        return PageIterator(fetch, total, pageSize=pageSize,
+                            concurrency=concurrency)
+
+    def fetch_all_job_results(self, callback, job_id, kind, total,
+                              params=None, spool=None):
+        """ streams every page to callback(formattedPage, params), and to
+        the spool when one is given """
+        params = params or {}
+        results_format = params.get('results_format', 'grid')
+        pageSize = params.get('page_size', 10000)
+
+        def run():
+            target = spool
+            if target is not None and target.complete:
+                # every row is spooled already
+                target = None
+            elif target is not None and len(target):
+                # rows of an earlier, cut short fetch
+                target.clear()
+
+            # text tables are written as one table, widths fixed by the
+            # first page; longer cells further on wrap rather than get cut
+            table = None
+            writer = CsvWriter(Convertor.csv_file_path()) \
+                if results_format == 'csv' else None
+            export = SqliteExport(Convertor.sqlite_file_path(), table=kind,
+                                  indexes=params.get('sqlite_indexes')) \
+                if results_format == 'sqlite' else None
+            try:
+                for offset, rows in self.iter_job_results(job_id, kind, total,
+                                                          pageSize=pageSize):
+                    if target is not None:
+                        target.append(rows)
+
+                    pageParams = dict(params, offset=offset, count=len(rows))
+                    if results_format in STREAMING_FORMATS and rows:
+                        if table is None:
+                            table = TableWriter(results_format,
+                                                title=columnTitle).measure(rows)
+                            callback(table.header(), params=pageParams)
+                        for chunk in table.chunks(rows):
+                            callback(chunk, params=pageParams)
+                        continue
+
+                    if export is not None:
+                        export.write(rows)
+                        callback('-- {done} of {total} {kind} loaded\n'.format(
+                            done=offset + len(rows), total=total, kind=kind),
+                            params=pageParams)
+                        continue
+
+                    if writer is not None:
+                        # one file for the whole job, written page by page
+                        callback(writer.write(rows), params=pageParams)
+                        continue
+
+                    callback(get_formatted_results(
+                        root=kind, results_format=results_format,
+                        json_raw_data=rows, offset=offset) or '',
+                        params=pageParams)
+                if table is not None:
+                    callback(table.footer(), params=params)
+                if export is not None:
+                    callback(export.summary(export.finish()), params=params)
+                    export = None
+                if target is not None:
+                    target.finish(total=total)
+            except Exception as e:
+                # transport and spool errors too, the output and the spool
+                # must not look like a complete result
+                if not isinstance(e, SumoAPIException):
+                    logger.exception('Failed to fetch all %s of job %s',
+                                     kind, job_id)
+                callback('\n{err}\n'.format(err=getattr(e, 'msg', e)),
+                         params=params)
+                if target is not None:
+                    target.abandon(total=total)
+            finally:
+                if export is not None:
+                    export.abort()
+                if writer is not None:
+                    writer.close()
+                    if writer.rows:
+                        Convertor.open_file(writer.path)
+
+        if self.executor:
+            self.executor.submit(run, key=self.name)
+        else:
+            run()
+
+    def get_job_messages(self, callback, job_id, params=None, fetchAll=False,
+                         total=None, spool=None):
+        if fetchAll:
+            return self.fetch_all_job_results(callback, job_id, 'messages',
+                                              total, params=params,
+                                              spool=spool)
 
-    def get_job_messages(self, callback, job_id, params=None):
         local_params = {"parent_uri_name": "search/jobs",
                         "parent_uri_id": job_id, "uri_name": "messages",
                         "results_format": "grid", "json_root": "messages",
@@ -182,9 +332,16 @@ class Connection(object):
                                   params=merge_dicts(master=params, slave=local_params),
                                   encoding=self.encoding,
                                   options={'show_query': self.show_query},
-                                  timeout=self.timeout, silenceErrors=False)
+                                  timeout=self.timeout, silenceErrors=False,
+                                  executor=self.executor, poolKey=self.name)
+
+    def get_job_records(self, callback, job_id, params=None, fetchAll=False,
+                        total=None, spool=None):
+        if fetchAll:
+            return self.fetch_all_job_results(callback, job_id, 'records',
+                                              total, params=params,
+                                              spool=spool)
 
-    def get_job_records(self, callback, job_id, params=None):
         local_params = {"parent_uri_name": "search/jobs",
                         "parent_uri_id": job_id, "uri_name": "records",
                         "results_format": "grid", "json_root": "records",
@@ -195,13 +352,20 @@ class Connection(object):
                                   params=merge_dicts(master=params, slave=local_params),
                                   encoding=self.encoding,
                                   options={'show_query': self.show_query},
-                                  timeout=self.timeout, silenceErrors=False)
+                                  timeout=self.timeout, silenceErrors=False,
+                                  executor=self.executor, poolKey=self.name)
 
     @staticmethod
     def setTimeout(timeout):
         Connection.timeout = timeout
         logger.info('Connection timeout set to {0} seconds'.format(timeout))
 
+    @staticmethod
+    def setExecutor(executor):
+        Connection.executor = executor
+        logger.info('Connection worker pool size is {0}'.format(
+                                                        executor.maxWorkers))
+
     @staticmethod
     def setHistoryManager(manager):
         Connection.history = manager
@@ -0,0 +1,123 @@
+__version__ = "v0.0.1"
+
+import logging
+from collections import deque, OrderedDict
+from threading import Thread, Condition
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorShutdownException(Exception):
+    pass
+
+
+class CommandExecutor(object):
+    """ bounded worker pool, tasks are queued and capped per connection """
+
+    def __init__(self, maxWorkers=8, maxPerKey=4):
+        self.maxWorkers = max(1, maxWorkers)
+        self.maxPerKey = max(1, maxPerKey)
+        self.keyLimits = {}
+        self.pending = OrderedDict()
+        self.active = {}
+        self.workers = []
+        self.idle = 0
+        self.closed = False
+        self.condition = Condition()
+
+    def setKeyLimit(self, key, limit=None):
+        with self.condition:
+            if limit:
+                self.keyLimits[key] = max(1, limit)
+            else:
+                self.keyLimits.pop(key, None)
+            self.condition.notify_all()
+
+    def getKeyLimit(self, key):
+        return self.keyLimits.get(key, self.maxPerKey)
+
+    def submit(self, fn, key=None):
+        with self.condition:
+            if self.closed:
+                raise ExecutorShutdownException('Executor is shut down')
+
+            self.pending.setdefault(key, deque()).append(fn)
+
+            # idle only drops once a notified worker wakes up, so a burst of
+            # submits is compared against everything still queued
+            pending = sum(len(tasks) for tasks in self.pending.values())
+            if pending > self.idle and len(self.workers) < self.maxWorkers:
+                worker = Thread(target=self._work, name='SumoSwissKnife-{0}'.
+                                format(len(self.workers)))
+                worker.daemon = True
+                self.workers.append(worker)
+                worker.start()
+
+            self.condition.notify()
+
+    def pendingCount(self, key=None):
+        with self.condition:
+            if key is not None:
+                return len(self.pending.get(key, ()))
+            return sum(len(tasks) for tasks in self.pending.values())
+
+    def activeCount(self, key=None):
+        with self.condition:
+            if key is not None:
+                return self.active.get(key, 0)
+            return sum(self.active.values())
+
+    def _nextTask(self):
+        for key in list(self.pending.keys()):
+            if self.active.get(key, 0) >= self.getKeyLimit(key):
+                continue
+
+            tasks = self.pending[key]
+            fn = tasks.popleft()
+            if tasks:
+                # round robin between connections
+                self.pending.move_to_end(key)
+            else:
+                del self.pending[key]
+            return key, fn
+        return None, None
+
+    def _work(self):
+        while True:
+            with self.condition:
+                key, fn = self._nextTask()
+                while fn is None and not self.closed:
+                    self.idle += 1
+                    self.condition.wait()
+                    self.idle -= 1
+                    key, fn = self._nextTask()
+
+                if fn is None:
+                    return
+
+                self.active[key] = self.active.get(key, 0) + 1
+
+            try:
+                fn()
+            except Exception:
+                logger.exception('Unhandled error in worker task')
+            finally:
+                with self.condition:
+                    self.active[key] -= 1
+                    if self.active[key] <= 0:
+                        del self.active[key]
+                    self.condition.notify_all()
+
+    def shutdown(self, timeout=5):
+        with self.condition:
+            self.closed = True
+            dropped = sum(len(tasks) for tasks in self.pending.values())
+            self.pending.clear()
+            self.condition.notify_all()
+            workers = list(self.workers)
+
+        if dropped:
+            logger.info('Dropped {0} pending tasks on shutdown'.format(dropped))
+
+        for worker in workers:
+            worker.join(timeout)
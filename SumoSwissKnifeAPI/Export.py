@@ -0,0 +1,168 @@
+__version__ = "v0.0.1"
+
+import re
+import json
+import logging
+import sqlite3
+from collections import OrderedDict
+from .Table import rowMap
+
+logger = logging.getLogger(__name__)
+
+INT = re.compile(r'^-?(0|[1-9]\d{0,17})$')
+# column affinity in the order a column can widen to
+AFFINITIES = ('INTEGER', 'REAL', 'TEXT')
+
+
+def quoteName(name):
+    return '"{0}"'.format(str(name).replace('"', '""'))
+
+
+def affinity(value):
+    """ the narrowest SQLite type holding the value, None when empty """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return 'INTEGER'
+    if isinstance(value, int):
+        return 'INTEGER'
+    if isinstance(value, float):
+        return 'REAL'
+    if not isinstance(value, str):
+        return 'TEXT'
+    if INT.match(value):
+        return 'INTEGER'
+    try:
+        float(value)
+        return 'REAL'
+    except ValueError:
+        return 'TEXT'
+
+
+def sqlValue(value, columnAffinity):
+    if value is None or value == '':
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if columnAffinity == 'INTEGER':
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return str(value)
+    if columnAffinity == 'REAL':
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return str(value)
+    return value if isinstance(value, str) else str(value)
+
+
+class SqliteExport(object):
+    """ bulk loads rows into one table of a SQLite file in a single
+    transaction, column types inferred from the first rows of each column
+    and indexes built once everything is in """
+
+    def __init__(self, filename, table='messages', indexes=None,
+                 batchSize=5000):
+        self.filename = filename
+        self.table = table
+        self.indexes = indexes or []
+        self.batchSize = batchSize
+        self.columns = OrderedDict()
+        self.rows = 0
+        self.conn = sqlite3.connect(filename, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=MEMORY')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.execute('BEGIN')
+        self.conn.execute('DROP TABLE IF EXISTS {0}'.format(quoteName(table)))
+        self.created = False
+
+    def _infer(self, maps):
+        """ types of the columns first seen in these rows """
+        added = OrderedDict()
+        for row in maps:
+            for name, value in row.items():
+                if name in self.columns:
+                    continue
+                kind = affinity(value)
+                current = added.get(name)
+                if current is None or (kind is not None and
+                                       AFFINITIES.index(kind) >
+                                       AFFINITIES.index(current)):
+                    added[name] = kind or current
+
+        for name, kind in added.items():
+            added[name] = kind or 'TEXT'
+        return added
+
+    def _addColumns(self, added):
+        if not self.created:
+            self.conn.execute('CREATE TABLE {table} ({columns})'.format(
+                table=quoteName(self.table),
+                columns=', '.join('{0} {1}'.format(quoteName(name), kind)
+                                  for name, kind in added.items())))
+            self.created = True
+        else:
+            for name, kind in added.items():
+                self.conn.execute('ALTER TABLE {table} ADD COLUMN {0} {1}'
+                                  .format(quoteName(name), kind,
+                                          table=quoteName(self.table)))
+        self.columns.update(added)
+
+    def write(self, rows):
+        maps = [rowMap(row) for row in rows]
+        if not maps:
+            return 0
+
+        added = self._infer(maps)
+        if added:
+            self._addColumns(added)
+
+        names = list(self.columns.keys())
+        kinds = [self.columns[name] for name in names]
+        statement = 'INSERT INTO {table} ({columns}) VALUES ({marks})'.format(
+            table=quoteName(self.table),
+            columns=', '.join(quoteName(name) for name in names),
+            marks=', '.join('?' * len(names)))
+
+        for start in range(0, len(maps), self.batchSize):
+            self.conn.executemany(statement, (
+                [sqlValue(row.get(name), kind)
+                 for name, kind in zip(names, kinds)]
+                for row in maps[start:start + self.batchSize]))
+        self.rows += len(maps)
+        return len(maps)
+
+    def finish(self):
+        """ commits the rows and builds the indexes on the fields present """
+        lowered = dict((name.lower(), name) for name in self.columns)
+        indexed = []
+        for field in self.indexes:
+            name = lowered.get(field.lower())
+            if name is None:
+                continue
+            self.conn.execute('CREATE INDEX IF NOT EXISTS {index} ON '
+                              '{table} ({column})'.format(
+                                  index=quoteName('{0}_{1}'.format(
+                                      self.table, name)),
+                                  table=quoteName(self.table),
+                                  column=quoteName(name)))
+            indexed.append(name)
+        self.conn.execute('COMMIT')
+        self.conn.close()
+        return indexed
+
+    def abort(self):
+        try:
+            self.conn.execute('ROLLBACK')
+        except sqlite3.Error:
+            logger.debug('Nothing to roll back in %s', self.filename)
+        self.conn.close()
+
+    def summary(self, indexed=None):
+        return '-- {rows} rows loaded into table {table} of {filename}' \
+            '{indexes}\n'.format(
+                rows=self.rows, table=self.table, filename=self.filename,
+                indexes=' (indexed on {0})'.format(', '.join(indexed))
+                if indexed else '')
@@ -0,0 +1,143 @@
+__version__ = "v0.0.1"
+
+import time
+import heapq
+import logging
+from itertools import count
+from threading import Thread, Condition
+
+logger = logging.getLogger(__name__)
+
+# a search job stops changing once it reaches one of these
+FINAL_STATES = ('DONE GATHERING RESULTS', 'CANCELLED', 'FORCE PAUSED')
+
+
+def isFinished(status):
+    if not isinstance(status, dict):
+        # errors come back as a list of SumoAPIException dicts
+        return True
+    return status.get('state') in FINAL_STATES or 'error' in status
+
+
+class PolledJob(object):
+    def __init__(self, conn, job_id, onStatus, onDone, interval):
+        self.conn = conn
+        self.job_id = job_id
+        self.onStatus = onStatus
+        self.onDone = onDone
+        self.interval = interval
+        self.polls = 0
+        self.startedAt = time.time()
+
+
+class JobPoller(object):
+    """ one scheduler thread polling all active search jobs, backing off as they run longer """
+
+    def __init__(self, minInterval=0.5, maxInterval=30, backoff=1.5):
+        self.minInterval = minInterval
+        # Sumo cancels search jobs which are not polled for 5 minutes
+        self.maxInterval = min(maxInterval, 240)
+        self.backoff = max(1.0, backoff)
+        self.jobs = {}
+        self.queue = []
+        self.sequence = count()
+        self.closed = False
+        self.thread = None
+        self.condition = Condition()
+
+    def watch(self, conn, job_id, onStatus=None, onDone=None):
+        """ onStatus(status, job_id) after every poll, onDone(status, job_id) once finished """
+        with self.condition:
+            if self.closed:
+                return
+
+            self.jobs[job_id] = PolledJob(conn, job_id, onStatus, onDone,
+                                          self.minInterval)
+            self._schedule(job_id, 0)
+
+            if not self.thread:
+                self.thread = Thread(target=self._run,
+                                     name='SumoSwissKnife-JobPoller')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def cancel(self, job_id):
+        with self.condition:
+            return self.jobs.pop(job_id, None) is not None
+
+    def activeJobs(self):
+        with self.condition:
+            return list(self.jobs.keys())
+
+    def _schedule(self, job_id, delay):
+        heapq.heappush(self.queue, (time.time() + delay, next(self.sequence),
+                                    job_id))
+        self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed:
+                    if self.queue:
+                        wait = self.queue[0][0] - time.time()
+                        if wait <= 0:
+                            break
+                        self.condition.wait(wait)
+                    else:
+                        self.condition.wait()
+
+                if self.closed:
+                    return
+
+                _, _, job_id = heapq.heappop(self.queue)
+                job = self.jobs.get(job_id)
+
+            if job:
+                self._poll(job)
+
+    def _poll(self, job):
+        # the request runs on the connection's worker pool, this thread
+        # only keeps time
+        job.polls += 1
+        try:
+            job.conn.search_job_polling(
+                params={'uri_id': job.job_id},
+                callback=lambda status, params=None: self._onStatus(job, status))
+        except Exception as e:
+            # transport errors end the job as an error status, so onDone
+            # still fires
+            logger.exception('Failed to poll search job %s', job.job_id)
+            self._onStatus(job, [{'errors': [], 'msg': str(e)}])
+
+    def _onStatus(self, job, status):
+        with self.condition:
+            if self.jobs.get(job.job_id) is not job:
+                # cancelled meanwhile
+                return
+
+            finished = isFinished(status)
+            if finished:
+                del self.jobs[job.job_id]
+            else:
+                job.interval = min(self.maxInterval,
+                                   job.interval * self.backoff)
+                self._schedule(job.job_id, job.interval)
+
+        try:
+            if job.onStatus:
+                job.onStatus(status, job.job_id)
+            if finished and job.onDone:
+                job.onDone(status, job.job_id)
+        except Exception:
+            logger.exception('Search job %s callback failed', job.job_id)
+
+    def shutdown(self, timeout=5):
+        with self.condition:
+            self.closed = True
+            self.jobs.clear()
+            self.queue = []
+            self.condition.notify_all()
+            thread = self.thread
+
+        if thread:
+            thread.join(timeout)
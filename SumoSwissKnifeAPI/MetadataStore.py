@@ -0,0 +1,204 @@
+__version__ = "v0.0.1"
+
+import os
+import json
+import logging
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+from .Utils import parseRawJson
+
+logger = logging.getLogger(__name__)
+
+# table: indexed columns, taken from the API objects (json keeps the rest)
+TABLES = [
+    ('collectors', ['name', 'category']),
+    ('sources', ['collector_id', 'name', 'category']),
+    ('fers', ['name', 'scope']),
+    ('partitions', ['name']),
+    ('views', ['indexName']),
+    ('users', ['email']),
+    ('roles', ['name']),
+]
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS queries (name TEXT PRIMARY KEY, query TEXT)',
+    'CREATE TABLE IF NOT EXISTS sync_state (resource TEXT PRIMARY KEY, '
+    'json TEXT)',
+]
+
+for table, columns in TABLES:
+    SCHEMA.append('CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, '
+                  '{columns}, json TEXT)'.format(
+                      table=table,
+                      columns=', '.join('{0} TEXT'.format(column)
+                                        for column in columns)))
+    for column in columns:
+        SCHEMA.append('CREATE INDEX IF NOT EXISTS {table}_{column} ON '
+                      '{table} ({column})'.format(table=table, column=column))
+
+LEGACY_FILES = ['collectors', 'queries', 'fers', 'partitions', 'views',
+                'users', 'roles']
+
+
+class MetadataStore(object):
+    """ per connection SQLite cache of the Sumo metadata """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+        with self.lock, self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _columns(self, table):
+        return dict(TABLES)[table]
+
+    def _rows(self, table, items, extra=None):
+        columns = self._columns(table)
+        for item in items:
+            if 'id' not in item:
+                continue
+            values = [str(item['id'])]
+            for column in columns:
+                if extra and column in extra:
+                    values.append(extra[column])
+                else:
+                    value = item.get(column)
+                    values.append(None if value is None else str(value))
+            values.append(json.dumps(item))
+            yield values
+
+    def _insert(self, table, rows):
+        columns = ['id'] + self._columns(table) + ['json']
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO {table} ({columns}) VALUES ({values})'.
+            format(table=table, columns=', '.join(columns),
+                   values=', '.join('?' * len(columns))), rows)
+
+    def save(self, resource, items):
+        if resource == 'collectors':
+            return self.saveCollectors(items)
+        if resource == 'queries':
+            return self.saveQueries(items)
+
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM {table}'.format(table=resource))
+            self._insert(resource, self._rows(resource, items))
+
+    def load(self, resource):
+        if resource == 'collectors':
+            return self.loadCollectors()
+        if resource == 'queries':
+            return self.loadQueries()
+
+        with self.lock:
+            cursor = self.conn.execute(
+                'SELECT json FROM {table} ORDER BY rowid'.format(
+                    table=resource))
+            return [json.loads(row['json']) for row in cursor]
+
+    def saveCollectors(self, collectors):
+        if isinstance(collectors, dict):
+            collectors = list(collectors.values())
+
+        with self.lock, self.conn:
+            for table in ['collectors', 'sources']:
+                self.conn.execute('DELETE FROM {table}'.format(table=table))
+
+            for collector in collectors:
+                sources = collector.get('sources', None) or []
+                stripped = {key: value for key, value in collector.items()
+                            if key != 'sources'}
+                stripped['hasSources'] = 'sources' in collector
+                self._insert('collectors', self._rows('collectors',
+                                                      [stripped]))
+                self._insert('sources', self._rows(
+                    'sources', sources,
+                    extra={'collector_id': str(collector['id'])}))
+
+    def loadCollectors(self, withSources=True):
+        collectors = OrderedDict()
+        with self.lock:
+            for row in self.conn.execute(
+                    'SELECT json FROM collectors ORDER BY rowid'):
+                collector = json.loads(row['json'])
+                if collector.pop('hasSources', True) and withSources:
+                    collector['sources'] = []
+                collectors[collector['id']] = collector
+
+            if not withSources:
+                return collectors
+
+            by_id = {str(collector_id): collector for collector_id, collector
+                     in collectors.items()}
+            for row in self.conn.execute(
+                    'SELECT collector_id, json FROM sources ORDER BY rowid'):
+                collector = by_id.get(row['collector_id'])
+                if collector is not None:
+                    collector.setdefault('sources', []).append(
+                        json.loads(row['json']))
+
+        return collectors
+
+    def saveQueries(self, queries):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM queries')
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO queries (name, query) VALUES (?, ?)',
+                list(queries.items()))
+
+    def loadQueries(self):
+        with self.lock:
+            return OrderedDict(
+                (row['name'], row['query']) for row in self.conn.execute(
+                    'SELECT name, query FROM queries ORDER BY rowid'))
+
+    def loadSyncState(self):
+        with self.lock:
+            return {row['resource']: json.loads(row['json'])
+                    for row in self.conn.execute(
+                        'SELECT resource, json FROM sync_state')}
+
+    def saveSyncState(self, state):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO sync_state (resource, json) '
+                'VALUES (?, ?)',
+                [(resource, json.dumps(entry))
+                 for resource, entry in state.items()])
+
+    def count(self, table):
+        with self.lock:
+            return self.conn.execute(
+                'SELECT COUNT(*) FROM {table}'.format(table=table)
+            ).fetchone()[0]
+
+    def isEmpty(self):
+        return all(self.count(table) == 0 for table, _ in TABLES)
+
+    def sourcesByCategory(self, category):
+        with self.lock:
+            return [json.loads(row['json']) for row in self.conn.execute(
+                'SELECT json FROM sources WHERE category = ? ORDER BY rowid',
+                (category,))]
+
+    def importLegacy(self, folder):
+        """ one off import of the flat JSON files used by older versions """
+        imported = []
+        for name in LEGACY_FILES:
+            filename = os.path.join(folder, name)
+            if not os.path.exists(filename):
+                continue
+            items = parseRawJson(filename)
+            if items:
+                self.save(name, items)
+                imported.append(name)
+        return imported
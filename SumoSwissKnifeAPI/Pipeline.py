@@ -0,0 +1,212 @@
+__version__ = "v0.0.1"
+
+import re
+import operator
+from .Columnar import numpy
+
+# and / or outside of double quotes, and binds tighter
+OR = re.compile(r'\s+or\s+(?=(?:[^"]*"[^"]*")*[^"]*$)', re.IGNORECASE)
+AND = re.compile(r'\s+and\s+(?=(?:[^"]*"[^"]*")*[^"]*$)', re.IGNORECASE)
+CONDITION = re.compile(
+    r'^(\w+)\s*(!=|>=|<=|==?|>|<|\s(?:contains|matches)\s)\s*(.+)$',
+    re.IGNORECASE)
+AGGREGATE = re.compile(
+    r'^(count_distinct|count|sum|min|max|avg)\s*(?:\(\s*(\w*)\s*\))?'
+    r'(?:\s+as\s+(\w+))?$', re.IGNORECASE)
+SORT = re.compile(r'^(?:sort|order)(?:\s+by)?\s+(\w+)(?:\s+(asc|desc))?$',
+                  re.IGNORECASE)
+LIMIT = re.compile(r'^(?:top|limit|head)\s+(\d+)$', re.IGNORECASE)
+
+COMPARISONS = {'=': operator.eq, '==': operator.eq, '!=': operator.ne,
+               '>': operator.gt, '>=': operator.ge, '<': operator.lt,
+               '<=': operator.le}
+
+
+class PipelineError(ValueError):
+    pass
+
+
+def _unquote(value):
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    return value
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _wildcard(pattern):
+    return re.compile('^' + '.*'.join(re.escape(part) for part in
+                                      pattern.split('*')) + '$',
+                      re.IGNORECASE | re.DOTALL)
+
+
+def _predicate(op, value):
+    """ test on a field's text, comparisons numeric when both sides are numbers """
+    if op == 'contains':
+        needle = value.lower()
+        return lambda text: text is not None and needle in text.lower()
+    if op == 'matches':
+        pattern = _wildcard(value)
+        return lambda text: text is not None and \
+            pattern.match(text) is not None
+
+    compare = COMPARISONS[op]
+    number = _float(value)
+
+    def test(text):
+        if text is None:
+            return op == '!='
+        other = _float(text) if number is not None else None
+        if other is not None:
+            return compare(other, number)
+        return compare(text, value) if op in ('=', '==', '!=') else False
+    return test
+
+
+def _mask(result, name, op, value):
+    """ one boolean per row, evaluated once per distinct string or over
+    the whole number array at once """
+    column = result.column(name)
+    test = _predicate(op, value)
+    if column is None:
+        return [test(None)] * len(result)
+
+    if column.kind == 'str':
+        hits = [test(text) for text in column.strings]
+        missing = test(None)
+        return [hits[code] if code >= 0 else missing for code in column.data]
+
+    number = _float(value)
+    if op in COMPARISONS and number is not None:
+        compare = COMPARISONS[op]
+        if numpy is not None:
+            # nan compares false, except for !=
+            return compare(column.numbers(), number)
+        missing = column.missing
+        return [test(None) if idx in missing else compare(value, number)
+                for idx, value in enumerate(column.data)]
+
+    return [test(column.value(idx)) for idx in range(len(result))]
+
+
+def _combine(masks, both):
+    if numpy is not None:
+        masks = [numpy.asarray(mask, dtype=bool) for mask in masks]
+        combined = masks[0]
+        for mask in masks[1:]:
+            combined = (combined & mask) if both else (combined | mask)
+        return combined
+
+    combined = masks[0]
+    for mask in masks[1:]:
+        combined = [a and b if both else a or b
+                    for a, b in zip(combined, mask)]
+    return combined
+
+
+def _indexes(mask):
+    if numpy is not None:
+        return numpy.flatnonzero(numpy.asarray(mask, dtype=bool)).tolist()
+    return [idx for idx, hit in enumerate(mask) if hit]
+
+
+def _fieldNames(text):
+    return [name.strip() for name in text.split(',') if name.strip()]
+
+
+class LocalPipeline(object):
+    """ where, fields, sort, top and count/sum/avg/min/max by stages run
+    over a fetched ColumnarResult, no search job involved """
+
+    def __init__(self, text):
+        self.text = text
+        self.stages = [self._parse(segment.strip())
+                       for segment in text.split('|') if segment.strip()]
+
+    def _parse(self, segment):
+        word = segment.split(None, 1)[0].lower()
+        rest = segment[len(word):].strip()
+
+        if word == 'where':
+            if not rest:
+                raise PipelineError('where needs a condition')
+            groups = []
+            for alternative in OR.split(rest):
+                conditions = []
+                for condition in AND.split(alternative):
+                    match = CONDITION.match(condition.strip())
+                    if not match:
+                        raise PipelineError(
+                            "can't read condition '{0}'".format(condition))
+                    name, op, value = match.groups()
+                    conditions.append((name, op.strip().lower(),
+                                       _unquote(value)))
+                groups.append(conditions)
+            return ('where', groups)
+
+        if word == 'fields':
+            return ('fields', _fieldNames(rest))
+
+        sort, limit = SORT.match(segment), LIMIT.match(segment)
+        if sort:
+            return ('sort', (sort.group(1),
+                             (sort.group(2) or 'desc').lower() == 'desc'))
+        if limit:
+            return ('limit', int(limit.group(1)))
+
+        parts = re.split(r'\s+by\s+', segment, maxsplit=1,
+                         flags=re.IGNORECASE)
+        aggregates = []
+        for item in parts[0].split(','):
+            match = AGGREGATE.match(item.strip())
+            if not match:
+                raise PipelineError(
+                    "unknown stage '{0}'".format(segment))
+            op, field, alias = match.groups()
+            op = op.lower()
+            if op != 'count' and not field:
+                raise PipelineError('{0} needs a field'.format(op))
+            aggregates.append((op, field or None, alias or '_' + op))
+        keys = _fieldNames(parts[1]) if len(parts) > 1 else []
+        return ('aggregate', (keys, aggregates))
+
+    @staticmethod
+    def _resolve(result, name):
+        """ field names as in the result, matched case insensitively """
+        if name in result.columns:
+            return name
+        lowered = name.lower()
+        for field in result.columns:
+            if field.lower() == lowered:
+                return field
+        return name
+
+    def run(self, result):
+        for stage, args in self.stages:
+            if stage == 'where':
+                masks = [_combine([_mask(result, self._resolve(result, name),
+                                         op, value)
+                                   for name, op, value in conditions], True)
+                         for conditions in args]
+                result = result.take(_indexes(_combine(masks, False)))
+            elif stage == 'fields':
+                result = result.select([self._resolve(result, name)
+                                        for name in args])
+            elif stage == 'sort':
+                name, desc = args
+                result = result.sorted(self._resolve(result, name), desc)
+            elif stage == 'limit':
+                result = result.take(range(min(args, len(result))))
+            elif stage == 'aggregate':
+                keys, aggregates = args
+                result = result.aggregate(
+                    [self._resolve(result, key) for key in keys],
+                    [(op, self._resolve(result, field) if field else None,
+                      alias) for op, field, alias in aggregates])
+        return result
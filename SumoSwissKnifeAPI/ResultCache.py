@@ -0,0 +1,162 @@
+__version__ = "v0.0.1"
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+from collections import OrderedDict
+from threading import Lock
+from .Spool import ResultSpool
+
+logger = logging.getLogger(__name__)
+
+# quoted literals are matched first so they are kept as written; a run of
+# comments and whitespace outside them becomes one space
+LAYOUT = re.compile(r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|'
+                    r'(?:\s+|/\*.*?\*/|//[^\n]*)+', re.DOTALL)
+
+
+def normalizeQuery(query):
+    """ comments and layout don't change what a query returns, text inside
+    quotes does
+
+    >>> normalizeQuery('_sourceCategory=web  // prod\\n| count')
+    '_sourceCategory=web | count'
+    >>> normalizeQuery('"https://a.example.com/login"') == \\
+    ...     normalizeQuery('"https://b.example.com/admin"')
+    False
+    >>> normalizeQuery("where url = 'a  /* b */'")
+    "where url = 'a  /* b */'"
+    """
+    return LAYOUT.sub(lambda match: match.group(0)
+                      if match.group(0)[0] in '"\'' else ' ', query).strip()
+
+
+def messageTime(row):
+    try:
+        return int(row.get('map', row).get('_messagetime', 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+class ResultCache(object):
+    """ LRU of spooled search results keyed by connection, normalized query
+    and absolute time window, bounded by entries, bytes and age """
+
+    def __init__(self, folder, maxEntries=50, maxBytes=256 * 1024 * 1024,
+                 ttl=900):
+        self.folder = folder
+        self.indexFile = os.path.join(folder, 'result_cache.json')
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.ttl = ttl
+        self.lock = Lock()
+        self.entries = OrderedDict()
+
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        if os.path.exists(self.indexFile):
+            try:
+                with open(self.indexFile) as f:
+                    self.entries = OrderedDict(
+                        (entry['key'], entry) for entry in json.load(f))
+            except (ValueError, KeyError):
+                logger.warning('Dropping unreadable result cache index')
+
+    @staticmethod
+    def key(connection, query, fromTime, toTime, kind):
+        content = json.dumps([connection, normalizeQuery(query), fromTime,
+                              toTime, kind])
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def _isFresh(self, entry):
+        return time.time() - entry['created'] <= self.ttl and \
+            ResultSpool.exists(self.folder, entry['spool'], entry['kind'])
+
+    def get(self, connection, query, fromTime, toTime, kind):
+        """ the entry for exactly this window, if still fresh """
+        key = self.key(connection, query, fromTime, toTime, kind)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if not self._isFresh(entry):
+                self._drop(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def overlap(self, connection, query, fromTime, toTime, kind):
+        """ a fresh entry covering the head of the window, so only
+        [entry['toTime'], toTime] is left to search """
+        query = normalizeQuery(query)
+        with self.lock:
+            for key, entry in reversed(list(self.entries.items())):
+                if entry['connection'] != connection or \
+                        entry['query'] != query or entry['kind'] != kind:
+                    continue
+                if entry['fromTime'] <= fromTime < entry['toTime'] < toTime \
+                        and self._isFresh(entry):
+                    self.entries.move_to_end(key)
+                    return entry
+        return None
+
+    def spool(self, entry):
+        return ResultSpool(self.folder, entry['spool'], entry['kind'])
+
+    def newSpool(self, kind):
+        spool_id = 'cache-{ts}'.format(ts=int(time.time() * 1000000))
+        return ResultSpool(self.folder, spool_id, kind)
+
+    def put(self, connection, query, fromTime, toTime, spool):
+        """ takes over a complete spool as the result of this window """
+        if not spool.complete:
+            # a cut short result would answer re-runs with missing rows
+            return None
+        key = self.key(connection, query, fromTime, toTime, spool.kind)
+        entry = {'key': key, 'connection': connection,
+                 'query': normalizeQuery(query), 'fromTime': fromTime,
+                 'toTime': toTime, 'kind': spool.kind, 'spool': spool.job_id,
+                 'rows': len(spool), 'bytes': spool.size,
+                 'created': time.time()}
+
+        with self.lock:
+            if key in self.entries and \
+                    self.entries[key]['spool'] != spool.job_id:
+                self._drop(key)
+            self.entries[key] = entry
+            self._evict()
+            self._save()
+        return entry
+
+    def _drop(self, key):
+        entry = self.entries.pop(key)
+        shutil.rmtree(os.path.join(self.folder, str(entry['spool'])),
+                      ignore_errors=True)
+
+    def _evict(self):
+        for key in [key for key, entry in self.entries.items()
+                    if time.time() - entry['created'] > self.ttl]:
+            self._drop(key)
+
+        while self.entries and (
+                len(self.entries) > self.maxEntries or
+                sum(entry['bytes'] for entry in self.entries.values())
+                > self.maxBytes):
+            self._drop(next(iter(self.entries)))
+
+    def _save(self):
+        temp = self.indexFile + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(list(self.entries.values()), f)
+        os.replace(temp, self.indexFile)
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries.keys()):
+                self._drop(key)
+            self._save()
@@ -0,0 +1,313 @@
+__version__ = "v0.0.1"
+
+import re
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# the search API hands out at most 10k messages or records per request
+PAGE_LIMIT = 10000
+
+# operators whose per slice results add up to the result over the window
+AGGREGATE_ITEM = re.compile(
+    r'^(count|sum|min|max)\s*(?:\(\s*([^)]*?)\s*\))?(?:\s+as\s+(\w+))?$',
+    re.IGNORECASE)
+AGGREGATE_OPERATORS = ('count', 'sum', 'min', 'max', 'avg', 'stddev', 'pct',
+                       'count_distinct', 'count_frequent', 'first', 'last',
+                       'most_recent', 'least_recent', 'top', 'fillmissing',
+                       'transpose', 'outlier', 'predict', 'logreduce',
+                       'logcompare', 'transaction', 'total', 'accum',
+                       'diff', 'smooth', 'rollingstd', 'backshift')
+# operators whose output depends on messages or rows across the whole
+# window, a query using any of them runs as one job
+UNSPLITTABLE_OPERATORS = ('dedup', 'transaction', 'transactionize',
+                          'sessionize', 'join', 'merge', 'trace', 'outlier',
+                          'compare', 'fillmissing', 'accum', 'diff',
+                          'backshift', 'smooth', 'rollingstd', 'predict',
+                          'total', 'logreduce', 'logcompare')
+SORT = re.compile(r'^(?:sort|order)(?:\s+by)?\s+(\w+)(?:\s+(asc|desc))?$',
+                  re.IGNORECASE)
+LIMIT = re.compile(r'^limit\s+(\d+)$', re.IGNORECASE)
+
+
+def splitWindow(fromTime, toTime, shards):
+    """ [fromTime, toTime] in epoch ms, as `shards` contiguous slices, newest first """
+    shards = max(1, min(shards, toTime - fromTime))
+    step = (toTime - fromTime) / float(shards)
+    edges = [int(round(fromTime + step * idx)) for idx in range(shards)]
+    edges.append(toTime)
+    slices = [(edges[idx], edges[idx + 1]) for idx in range(shards)]
+    return list(reversed(slices))
+
+
+def _operator(segment):
+    word = re.match(r'\s*(\w+)', segment)
+    return word.group(1).lower() if word else ''
+
+
+class AggregationPlan(object):
+    """ how the per slice results of a query are put back together """
+
+    def __init__(self, query):
+        self.aggregate = False
+        self.mergeable = True
+        self.reason = None
+        self.operators = {}
+        self.sortBy = None
+        self.sortDesc = True
+        self.limit = None
+        # what each slice runs, the trailing sort and limit of an
+        # aggregation only apply once the slices are merged
+        self.sliceQuery = query
+
+        segments = [segment.strip() for segment in query.split('|')]
+        aggregation = None
+        for idx, segment in enumerate(segments[1:], 1):
+            if _operator(segment) in AGGREGATE_OPERATORS:
+                aggregation = idx
+                break
+
+        self.aggregate = aggregation is not None
+        for segment in segments[1:]:
+            if _operator(segment) in UNSPLITTABLE_OPERATORS:
+                return self._unmergeable("'{0}' spans the whole window"
+                                         .format(_operator(segment)))
+
+        if aggregation is None:
+            self._parseTail(segments[1:], raw=True)
+            return
+
+        self._parseAggregation(segments[aggregation])
+        if self.mergeable:
+            self._parseTail(segments[aggregation + 1:])
+        if self.mergeable:
+            self.sliceQuery = '|'.join(query.split('|')[:aggregation + 1])
+
+    def _unmergeable(self, reason):
+        self.mergeable = False
+        self.reason = reason
+
+    def _parseAggregation(self, segment):
+        items = re.split(r'\s+by\s+', segment, maxsplit=1,
+                         flags=re.IGNORECASE)[0]
+        for item in items.split(','):
+            match = AGGREGATE_ITEM.match(item.strip())
+            if not match:
+                return self._unmergeable(
+                    "'{0}' can't be re-aggregated".format(item.strip()))
+            operator, _, alias = match.groups()
+            operator = operator.lower()
+            self.operators[(alias or '_' + operator).lower()] = operator
+
+    def _parseTail(self, segments, raw=False):
+        for segment in segments:
+            sort, limit = SORT.match(segment), LIMIT.match(segment)
+            if raw and _operator(segment) in ('sort', 'order'):
+                # slices are merged newest first, not in the sorted order
+                return self._unmergeable(
+                    "'{0}' over raw messages".format(_operator(segment)))
+            if sort and not raw:
+                self.sortBy = sort.group(1).lower()
+                self.sortDesc = (sort.group(2) or 'desc').lower() == 'desc'
+            elif limit:
+                self.limit = int(limit.group(1))
+            elif not raw:
+                return self._unmergeable(
+                    "'{0}' after the aggregation".format(_operator(segment)))
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _format(value):
+    if value is None:
+        return None
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def mergeMessages(shardMessages, limit=None):
+    """ newest first, like a single search job would return them """
+    messages = [message for messages in shardMessages for message in messages]
+    messages.sort(key=lambda message: int(
+        message.get('map', {}).get('_messagetime', 0) or 0), reverse=True)
+    return messages[:limit] if limit else messages
+
+
+def mergeRecords(shardRecords, fields, plan):
+    """ re-aggregates count/sum/min/max records grouped by their key fields """
+    keys = [field['name'] for field in fields if field.get('keyField')]
+    values = [field['name'] for field in fields if not field.get('keyField')]
+
+    groups = {}
+    order = []
+    for records in shardRecords:
+        for record in records:
+            row = record.get('map', record)
+            group = tuple(row.get(key) for key in keys)
+            merged = groups.get(group)
+            if merged is None:
+                groups[group] = dict(row)
+                order.append(group)
+                continue
+
+            for name in values:
+                operator = plan.operators.get(name.lower())
+                current, other = _number(merged.get(name)), \
+                    _number(row.get(name))
+                if other is None:
+                    continue
+                if current is None:
+                    merged[name] = row.get(name)
+                elif operator in ('count', 'sum'):
+                    merged[name] = _format(current + other)
+                elif operator == 'min':
+                    merged[name] = _format(min(current, other))
+                elif operator == 'max':
+                    merged[name] = _format(max(current, other))
+
+    rows = [groups[group] for group in order]
+    if plan.sortBy:
+        rows.sort(key=lambda row: (_number(row.get(plan.sortBy)) is None,
+                                   _number(row.get(plan.sortBy)) or 0),
+                  reverse=plan.sortDesc)
+    if plan.limit:
+        rows = rows[:plan.limit]
+    return [{'map': row} for row in rows]
+
+
+class Shard(object):
+    def __init__(self, index, fromTime, toTime):
+        self.index = index
+        self.fromTime = fromTime
+        self.toTime = toTime
+        self.job_id = None
+        self.messages = []
+        self.records = []
+        self.fields = []
+        self.error = None
+
+
+class ShardedSearch(object):
+    """ one query as concurrent search jobs over time slices, merged back into one result """
+
+    def __init__(self, conn, poller, query, fromTime, toTime, callback,
+                 shards=4, maxJobs=4, progress=None):
+        self.conn = conn
+        self.poller = poller
+        self.query = query
+        self.callback = callback
+        self.progress = progress
+        self.maxJobs = max(1, maxJobs)
+        self.plan = AggregationPlan(query)
+        self.shards = [Shard(idx, start, end) for idx, (start, end) in
+                       enumerate(splitWindow(fromTime, toTime, shards))]
+        self.pending = list(self.shards)
+        self.running = 0
+        self.finished = 0
+        self.lock = Lock()
+
+    def start(self):
+        self._startNext()
+
+    def _startNext(self):
+        with self.lock:
+            ready = []
+            while self.pending and self.running < self.maxJobs:
+                ready.append(self.pending.pop(0))
+                self.running += 1
+
+        for shard in ready:
+            self.conn.execute(params={"request_params": {
+                'query': self.plan.sliceQuery, 'from': shard.fromTime,
+                'to': shard.toTime}},
+                callback=lambda result, params=None, shard=shard:
+                self._onCreated(shard, result))
+
+    def _onCreated(self, shard, result):
+        if not isinstance(result, dict) or 'id' not in result:
+            return self._onShardDone(shard, error=result)
+
+        shard.job_id = result['id']
+        self.poller.watch(self.conn, shard.job_id,
+                          onDone=lambda status, job_id:
+                          self._onJobDone(shard, status))
+
+    def _onJobDone(self, shard, status):
+        if not isinstance(status, dict) or status.get('state') != \
+                'DONE GATHERING RESULTS':
+            return self._onShardDone(shard, error=status)
+
+        try:
+            if self.plan.aggregate:
+                shard.records, shard.fields = self._fetch(
+                    shard, 'records', status.get('recordCount', 0))
+            else:
+                shard.messages, shard.fields = self._fetch(
+                    shard, 'messages', status.get('messageCount', 0))
+        except Exception as e:
+            logger.exception('Failed to fetch shard %s results', shard.index)
+            return self._onShardDone(shard, error=getattr(e, '__dict__', str(e)))
+
+        self._onShardDone(shard)
+
+    def _fetch(self, shard, kind, total):
+        if self.plan.limit and not self.plan.aggregate:
+            total = min(total, self.plan.limit)
+
+        fields = []
+        if kind == 'records' and total:
+            # the field list, with its keyField flags, comes with any page
+            fields = self.conn.sumo.get_resources(
+                method='get', parent_uri_name='search/jobs',
+                parent_uri_id=shard.job_id, uri_name=kind, json_root=None,
+                request_params={'offset': 0, 'limit': 1}).get('fields', [])
+
+        rows = []
+        for _, page in self.conn.iter_job_results(shard.job_id, kind, total,
+                                                  pageSize=PAGE_LIMIT):
+            rows.extend(page)
+        return rows, fields
+
+    def _onShardDone(self, shard, error=None):
+        if error is not None:
+            shard.error = error
+
+        if shard.job_id:
+            try:
+                self.conn.sumo.delete('/api/v1/search/jobs/{0}'.format(
+                    shard.job_id))
+            except Exception:
+                logger.debug('Search job %s already gone', shard.job_id)
+
+        with self.lock:
+            self.running -= 1
+            self.finished += 1
+            finished = self.finished
+
+        if self.progress:
+            self.progress(shard, finished, len(self.shards))
+
+        if finished == len(self.shards):
+            self._merge()
+        else:
+            self._startNext()
+
+    def _merge(self):
+        errors = [shard.error for shard in self.shards
+                  if shard.error is not None]
+        fields = next((shard.fields for shard in self.shards
+                       if shard.fields), [])
+
+        if self.plan.aggregate:
+            results = mergeRecords([shard.records for shard in self.shards],
+                                   fields, self.plan)
+        else:
+            results = mergeMessages([shard.messages for shard in self.shards],
+                                    self.plan.limit)
+
+        self.callback(results, fields, errors)
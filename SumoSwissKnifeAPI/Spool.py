@@ -0,0 +1,196 @@
+__version__ = "v0.0.1"
+
+import os
+import json
+import mmap
+import time
+import shutil
+import struct
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# row n starts at byte OFFSET.unpack_from(index, n * OFFSET.size) of the data
+OFFSET = struct.Struct('<Q')
+
+
+def pruneSpools(folder, maxAge):
+    """ removes the job spools untouched for more than maxAge seconds """
+    if not maxAge or not os.path.isdir(folder):
+        return []
+
+    pruned = []
+    now = time.time()
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if os.path.isdir(path) and now - os.path.getmtime(path) > maxAge:
+            shutil.rmtree(path, ignore_errors=True)
+            pruned.append(name)
+    return pruned
+
+
+class ResultSpool(object):
+    """ append only NDJSON file of a job's messages or records, with a binary
+    offset index so any row range is read back through mmap """
+
+    def __init__(self, folder, job_id, kind='messages'):
+        self.folder = os.path.join(folder, str(job_id))
+        self.job_id = job_id
+        self.kind = kind
+        self.dataFile = os.path.join(self.folder, kind + '.ndjson')
+        self.indexFile = os.path.join(self.folder, kind + '.idx')
+        self.metaFile = os.path.join(self.folder, kind + '.json')
+        self.lock = Lock()
+        self.meta = {'job_id': job_id, 'kind': kind, 'fields': [],
+                     'count': 0, 'size': 0, 'complete': False,
+                     'created': time.time()}
+        self.size = 0
+        self.data = None
+        self.index = None
+        self.mapped = (0, None, None)
+
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        if os.path.exists(self.metaFile):
+            with open(self.metaFile) as f:
+                self.meta.update(json.load(f))
+
+        # rows past the last saved meta are dropped, they may be half written
+        self.data = open(self.dataFile, 'ab+')
+        self.index = open(self.indexFile, 'ab+')
+        self.index.truncate(self.meta['count'] * OFFSET.size)
+        self.size = self.meta['size']
+        self.data.truncate(self.size)
+
+    @staticmethod
+    def exists(folder, job_id, kind='messages'):
+        return os.path.exists(os.path.join(folder, str(job_id),
+                                           kind + '.json'))
+
+    def __len__(self):
+        return self.meta['count']
+
+    @property
+    def complete(self):
+        return self.meta['complete']
+
+    @property
+    def partial(self):
+        return self.meta.get('partial', False)
+
+    @property
+    def fields(self):
+        return self.meta['fields']
+
+    def append(self, rows, fields=None):
+        with self.lock:
+            offsets = bytearray()
+            lines = bytearray()
+            for row in rows:
+                offsets += OFFSET.pack(self.size + len(lines))
+                lines += json.dumps(row, separators=(',', ':')).encode('utf-8')
+                lines += b'\n'
+
+            self.data.seek(0, os.SEEK_END)
+            self.data.write(lines)
+            self.index.seek(0, os.SEEK_END)
+            self.index.write(offsets)
+            self.data.flush()
+            self.index.flush()
+
+            self.size += len(lines)
+            self.meta['size'] = self.size
+            self.meta['count'] += len(offsets) // OFFSET.size
+            if fields:
+                self.meta['fields'] = fields
+            self._saveMeta()
+
+    def finish(self, **meta):
+        with self.lock:
+            self.meta.update(meta)
+            self.meta['complete'] = True
+            self.meta['partial'] = False
+            self._saveMeta()
+
+    def abandon(self, **meta):
+        """ the rows spooled so far are a cut short result, never complete """
+        with self.lock:
+            self.meta.update(meta)
+            self.meta['complete'] = False
+            self.meta['partial'] = True
+            self._saveMeta()
+
+    def clear(self):
+        """ drops every row, to spool a result again from the start """
+        with self.lock:
+            self._unmap()
+            self.data.truncate(0)
+            self.index.truncate(0)
+            self.size = 0
+            self.meta.update(count=0, size=0, complete=False, partial=False)
+            self._saveMeta()
+
+    def _saveMeta(self):
+        temp = self.metaFile + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(temp, self.metaFile)
+
+    def _maps(self):
+        """ read only maps of the data and index, remapped once rows were appended """
+        count, data, index = self.mapped
+        if count != self.meta['count']:
+            for old in (data, index):
+                if old is not None:
+                    old.close()
+            data = mmap.mmap(self.data.fileno(), 0, access=mmap.ACCESS_READ) \
+                if self.size else None
+            index = mmap.mmap(self.index.fileno(), 0,
+                              access=mmap.ACCESS_READ) \
+                if self.meta['count'] else None
+            self.mapped = (self.meta['count'], data, index)
+        return self.mapped
+
+    def rawRows(self, start=0, stop=None):
+        """ the NDJSON lines of rows [start, stop) """
+        with self.lock:
+            count, data, index = self._maps()
+            stop = count if stop is None else min(stop, count)
+            if start >= stop:
+                return b''
+            begin = OFFSET.unpack_from(index, start * OFFSET.size)[0]
+            end = OFFSET.unpack_from(index, stop * OFFSET.size)[0] \
+                if stop < count else self.size
+            return data[begin:end]
+
+    def rows(self, start=0, stop=None):
+        return [json.loads(line.decode('utf-8')) for line in
+                self.rawRows(start, stop).splitlines()]
+
+    def pages(self, pageSize=1000, start=0, stop=None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        for offset in range(start, stop, pageSize):
+            yield offset, self.rows(offset, min(offset + pageSize, stop))
+
+    def _unmap(self):
+        _, data, index = self.mapped
+        for mapped in (data, index):
+            if mapped is not None:
+                mapped.close()
+        self.mapped = (0, None, None)
+
+    def close(self):
+        with self.lock:
+            self._unmap()
+            self.data.close()
+            self.index.close()
+
+    def delete(self):
+        self.close()
+        for filename in (self.dataFile, self.indexFile, self.metaFile):
+            if os.path.exists(filename):
+                os.remove(filename)
+        if not os.listdir(self.folder):
+            os.rmdir(self.folder)
@@ -1,13 +1,22 @@
 __version__ = "v0.0.1"
 
 import os
+import logging
+from threading import Lock
 from . import Utils as U
 
+logger = logging.getLogger(__name__)
+
 class Storage:
     def __init__(self, filename, default=None):
         self.storageFile = filename
         self.defaultFile = default
         self.items = {}
+        # the user items merged over the defaults, rebuilt only when either
+        # file's mtime or size changes
+        self.merged = {}
+        self.signatures = None
+        self.lock = Lock()
 
         # copy entire file, to keep comments
         # if not os.path.isfile(filename) and
@@ -16,20 +25,48 @@ class Storage:
 
         self.all()
 
+    @staticmethod
+    def signature(filename):
+        """ (mtime, size) of a file, None when there is none """
+        if not filename:
+            return None
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
     def all(self):
         userFile = self.getFilename()
-
-        if os.path.exists(userFile):
-            self.items = U.parseJson(self.getFilename())
-        else:
-            self.items = {}
-
-        return U.merge(self.items, self.defaults())
+        signatures = (self.signature(userFile),
+                      self.signature(self.defaultFile))
+
+        with self.lock:
+            if signatures == self.signatures:
+                return self.merged
+
+            try:
+                self.items = U.parseJson(userFile) \
+                    if signatures[0] is not None else {}
+                defaults = self.defaults()
+            except ValueError:
+                # half saved while being edited, the last good copy stays
+                # until the file changes again
+                logger.warning('Failed to parse %s', userFile)
+                self.signatures = signatures
+                return self.merged
+
+            self.merged = U.merge(self.items, defaults)
+            self.signatures = signatures
+            return self.merged
 
     def write(self):
-        return U.saveJson(self.items if
-                          isinstance(self.items, dict) else {},
-                          self.getFilename())
+        saved = U.saveJson(self.items if
+                           isinstance(self.items, dict) else {},
+                           self.getFilename())
+        with self.lock:
+            self.signatures = None
+        return saved
 
     def add(self, key, value):
         if len(key) <= 0:
@@ -0,0 +1,100 @@
+__version__ = "v0.0.1"
+
+import json
+import time
+import hashlib
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# fields changing on their own, which would flag every object as modified
+VOLATILE_FIELDS = ('alive', 'lastSeenAlive', 'sources', 'lastLoginTimestamp')
+
+
+def fingerprint(item, volatile=VOLATILE_FIELDS):
+    if 'modifiedAt' in item:
+        return str(item['modifiedAt'])
+
+    stable = {key: value for key, value in item.items()
+              if key not in volatile}
+    content = json.dumps(stable, sort_keys=True, default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class SyncState(object):
+    """ per resource fingerprints and sync time of the cached metadata """
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = Lock()
+        self.state = store.loadSyncState() or {}
+
+    def lastSync(self, resource):
+        return self.state.get(resource, {}).get('lastSync', 0)
+
+    def isStale(self, resource, ttl):
+        return time.time() - self.lastSync(resource) > ttl
+
+    def diff(self, resource, items, key='id'):
+        with self.lock:
+            known = self.state.get(resource, {}).get('items', {})
+
+        current = {str(item[key]): fingerprint(item)
+                   for item in items if key in item}
+
+        added = [k for k in current if k not in known]
+        changed = [k for k, fp in current.items()
+                   if k in known and known[k] != fp]
+        removed = [k for k in known if k not in current]
+
+        return added, changed, removed
+
+    def commit(self, resource, items, key='id'):
+        with self.lock:
+            self.state[resource] = {
+                'lastSync': time.time(),
+                'items': {str(item[key]): fingerprint(item)
+                          for item in items if key in item}
+            }
+
+    def fingerprints(self, resource):
+        with self.lock:
+            return dict(self.state.get(resource, {}).get('items', {}))
+
+    def restore(self, resource, ids, fingerprints):
+        """ puts back the earlier fingerprints of items which failed to sync,
+        items new since then are dropped so they show up as added again """
+        with self.lock:
+            items = self.state.get(resource, {}).get('items', {})
+            for item_id in ids:
+                item_id = str(item_id)
+                if item_id in fingerprints:
+                    items[item_id] = fingerprints[item_id]
+                else:
+                    items.pop(item_id, None)
+
+    def touch(self, resource, ids):
+        now = time.time()
+        with self.lock:
+            entry = self.state.setdefault(resource, {'lastSync': now,
+                                                     'items': {}})
+            entry['lastSync'] = now
+            for item_id in ids:
+                entry['items'][str(item_id)] = now
+
+    def retain(self, resource, ids):
+        keep = set(str(item_id) for item_id in ids)
+        with self.lock:
+            items = self.state.get(resource, {}).get('items', {})
+            for item_id in [k for k in items if k not in keep]:
+                del items[item_id]
+
+    def touchedAt(self, resource, item_id):
+        with self.lock:
+            return self.state.get(resource, {}).get('items', {}).get(
+                str(item_id), 0)
+
+    def save(self):
+        with self.lock:
+            self.store.saveSyncState(self.state)
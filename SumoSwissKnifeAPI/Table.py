@@ -0,0 +1,184 @@
+__version__ = "v0.0.1"
+
+import re
+from collections import namedtuple
+
+# same layout as tabulate's TableFormat, restricted to what is streamed
+Line = namedtuple('Line', ['begin', 'fill', 'sep', 'end'])
+DataRow = namedtuple('DataRow', ['begin', 'sep', 'end'])
+TableFormat = namedtuple('TableFormat', ['top', 'belowHeader', 'betweenRows',
+                                         'bottom', 'row', 'padding',
+                                         'aligned', 'multiline'])
+
+FORMATS = {
+    'grid': TableFormat(top=Line('+', '-', '+', '+'),
+                        belowHeader=Line('+', '=', '+', '+'),
+                        betweenRows=Line('+', '-', '+', '+'),
+                        bottom=Line('+', '-', '+', '+'),
+                        row=DataRow('|', '|', '|'), padding=1,
+                        aligned=False, multiline=True),
+    'psql': TableFormat(top=Line('+', '-', '+', '+'),
+                        belowHeader=Line('|', '-', '+', '|'),
+                        betweenRows=None,
+                        bottom=Line('+', '-', '+', '+'),
+                        row=DataRow('|', '|', '|'), padding=1,
+                        aligned=False, multiline=True),
+    'pipe': TableFormat(top=None,
+                        belowHeader=Line('|', '-', '|', '|'),
+                        betweenRows=None, bottom=None,
+                        row=DataRow('|', '|', '|'), padding=1,
+                        aligned=True, multiline=False),
+    'github': TableFormat(top=None,
+                          belowHeader=Line('|', '-', '|', '|'),
+                          betweenRows=None, bottom=None,
+                          row=DataRow('|', '|', '|'), padding=1,
+                          aligned=False, multiline=False),
+    'simple': TableFormat(top=None,
+                          belowHeader=Line('', '-', '  ', ''),
+                          betweenRows=None, bottom=None,
+                          row=DataRow('', '  ', ''), padding=0,
+                          aligned=False, multiline=True),
+    'plain': TableFormat(top=None, belowHeader=None, betweenRows=None,
+                         bottom=None, row=DataRow('', '  ', ''), padding=0,
+                         aligned=False, multiline=True),
+}
+
+STREAMING_FORMATS = tuple(FORMATS.keys())
+
+NUMBER = re.compile(r'^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$')
+
+
+def rowMap(row):
+    if 'map' in row and len(row) == 1:
+        return row['map']
+    return row
+
+
+def cellText(value):
+    if value is None:
+        return ''
+    return value if isinstance(value, str) else str(value)
+
+
+class TableWriter(object):
+    """ renders rows as text table chunks with the column widths fixed by
+    measure(), so a table can be written out while rows still arrive """
+
+    def __init__(self, tablefmt='grid', title=None, maxWidth=None):
+        self.format = FORMATS[tablefmt]
+        self.title = title or (lambda name: name)
+        self.maxWidth = maxWidth
+        self.columns = []
+        self.titles = {}
+        self.widths = {}
+        self.numeric = {}
+        self.written = 0
+
+    def measure(self, rows):
+        """ takes columns and widths from rows, all of them or a sample """
+        for row in rows:
+            for name, value in rowMap(row).items():
+                if name not in self.widths:
+                    self.columns.append(name)
+                    self.titles[name] = self.title(name)
+                    self.widths[name] = max(
+                        [len(line) for line in self._lines(self.titles[name])])
+                    self.numeric[name] = True
+
+                text = cellText(value)
+                if text:
+                    self.widths[name] = max(
+                        self.widths[name],
+                        max([len(line) for line in self._lines(text)]))
+                    if self.numeric[name] and not NUMBER.match(text):
+                        self.numeric[name] = False
+        return self
+
+    def _lines(self, text):
+        if not self.format.multiline:
+            return [text.replace('\r', '').replace('\n', ' ')]
+        return text.replace('\r', '').split('\n')
+
+    def _width(self, name):
+        width = self.widths[name]
+        return min(width, self.maxWidth) if self.maxWidth else width
+
+    def _wrap(self, lines, name):
+        """ lines wider than the measured sample are wrapped, never cut; in
+        single line formats the cell just gets wider """
+        width = self._width(name)
+        if not self.format.multiline or \
+                all(len(line) <= width for line in lines):
+            return lines
+        wrapped = []
+        for line in lines:
+            wrapped.extend([line[start:start + width] for start in
+                            range(0, len(line), width)] or [''])
+        return wrapped
+
+    def _fit(self, text, name):
+        width = self._width(name)
+        if self.numeric[name]:
+            return text.rjust(width)
+        return text.ljust(width)
+
+    def _line(self, line):
+        pad = self.format.padding
+        cells = []
+        for name in self.columns:
+            dashes = line.fill * (self._width(name) + 2 * pad)
+            if self.format.aligned and dashes:
+                dashes = dashes[:-1] + ':' if self.numeric[name] \
+                    else ':' + dashes[1:]
+            cells.append(dashes)
+        return line.begin + line.sep.join(cells) + line.end + '\n'
+
+    def _row(self, texts):
+        row = self.format.row
+        pad = ' ' * self.format.padding
+        cells = [self._wrap(self._lines(text), name)
+                 for name, text in zip(self.columns, texts)]
+        height = max([len(lines) for lines in cells]) if cells else 1
+        out = []
+        for idx in range(height):
+            parts = [self._fit(lines[idx] if idx < len(lines) else '', name)
+                     for name, lines in zip(self.columns, cells)]
+            text = row.begin + pad + (pad + row.sep + pad).join(parts) + \
+                pad + row.end
+            out.append((text.rstrip() if not row.end else text) + '\n')
+        return ''.join(out)
+
+    def header(self):
+        out = []
+        if self.format.top:
+            out.append(self._line(self.format.top))
+        out.append(self._row([self.titles[name] for name in self.columns]))
+        if self.format.belowHeader:
+            out.append(self._line(self.format.belowHeader))
+        return ''.join(out)
+
+    def rows(self, rows):
+        out = []
+        between = self.format.betweenRows
+        for row in rows:
+            if between and self.written:
+                out.append(self._line(between))
+            row = rowMap(row)
+            out.append(self._row([cellText(row.get(name))
+                                  for name in self.columns]))
+            self.written += 1
+        return ''.join(out)
+
+    def chunks(self, rows, size=500):
+        """ the rendered rows, `size` rows per chunk """
+        for start in range(0, len(rows), size):
+            yield self.rows(rows[start:start + size])
+
+    def footer(self):
+        if self.format.bottom:
+            return self._line(self.format.bottom)
+        return ''
+
+    def render(self, rows):
+        self.measure(rows)
+        return self.header() + self.rows(rows) + self.footer()
@@ -13,10 +13,16 @@ from dateutil.relativedelta import relativedelta, MO
 import pprint
 from pytz import timezone, all_timezones
 import csv
+import io
+import logging
 from tempfile import NamedTemporaryFile
 import time
 from os.path import expanduser
 from collections import OrderedDict
+from .Table import TableWriter, STREAMING_FORMATS, rowMap
+from .Export import SqliteExport
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -124,49 +130,35 @@ def listToTitles(list_phrases):
     return [toTitle((phrase.replace('_', '', 1)).replace('_',' ')) for phrase in list_phrases]
 
 
-def jsonListToTabulate(json_data, tabulate_format):
-    resultString = ''
-
-    processed_data = []
-    header = []
+def columnTitle(name):
+    return toTitle((name.replace('_', '', 1)).replace('_', ' '))
 
-    orig_jdata = json_data
-    list_jdata = list(json_data)
-    to_process = None
 
-    if isinstance(json_data, list):
-        to_process = orig_jdata
-    else:
-        to_process = list_jdata
+def jsonListToTabulate(json_data, tabulate_format):
+    to_process = json_data if isinstance(json_data, list) else list(json_data)
 
     if len(to_process) < 1 or len(to_process[0].keys()) < 1:
         return
 
-    all_col_names = []
+    if tabulate_format in STREAMING_FORMATS:
+        return TableWriter(tabulate_format, title=columnTitle).render(
+            to_process).rstrip('\n')
 
-    for row in to_process:
-        if 'map' in row.keys() and len(row.keys()) == 1:
-            row = row['map']
-        processed_data.append(row)
+    processed_data = [rowMap(row) for row in to_process]
+    header = OrderedDict()
+    for row in processed_data:
         for col_name in row.keys():
-            if col_name not in all_col_names:
-                all_col_names.append(col_name)
-
-    header = all_col_names
-    header = list(set(header))
+            header[col_name] = None
 
     beautified_header = OrderedDict()
 
     for header_col in header:
-        beautified_header[header_col] = toTitle((header_col.replace('_', '', 1)).replace('_', ' '))
-
+        beautified_header[header_col] = columnTitle(header_col)
 
     processed_data.insert(0, beautified_header)
 
-    resultString = tabulate(processed_data, headers='firstrow',
-                            tablefmt=tabulate_format)
-
-    return resultString
+    return tabulate(processed_data, headers='firstrow',
+                    tablefmt=tabulate_format)
 
 
 def create_connection(db_file):
@@ -305,7 +297,8 @@ def get_tz_specifc_ts(date_time):
         ).total_seconds()) * 1000)
 
 
-def get_formatted_results(root=None, results_format='json', json_raw_data={},offset=0):
+def get_formatted_results(root=None, results_format='json', json_raw_data={},offset=0,
+                          indexes=None):
     results = ''
     if results_format == 'json':
         results = json_raw_data
@@ -317,6 +310,10 @@ def get_formatted_results(root=None, results_format='json', json_raw_data={},off
     if results_format == 'csv':
         results = Convertor.json_to_csv(json_raw_data, offset)
 
+    if results_format == 'sqlite':
+        results = Convertor.json_to_sqlite(json_raw_data, root, offset,
+                                           indexes)
+
     if(results_format in
        ['plain', 'simple', 'github', 'grid', 'fancy_grid', 'pipe',
             'orgtbl', 'jira', 'presto', 'psql', 'rst', 'mediawiki',
@@ -355,8 +352,128 @@ def merge_dicts(master=None, slave=None):
     return all_kv
 
 
+
+def indexCollectorNames(collectors):
+    """ distinct collector names, source names and categories, first seen order """
+    collectors_names = OrderedDict()
+    sources_names = OrderedDict()
+    categories = OrderedDict()
+    total_sources = 0
+
+    for collector in collectors:
+        if collector.get('name'):
+            collectors_names[collector['name']] = None
+        if collector.get('category'):
+            categories[collector['category']] = None
+
+        for source in collector.get('sources') or []:
+            total_sources += 1
+            if source.get('name'):
+                sources_names[source['name']] = None
+            if source.get('category'):
+                categories[source['category']] = None
+
+    return list(collectors_names), list(sources_names), list(categories), \
+        total_sources
+
+class Flattener(object):
+    """ nested dicts and lists as one level of '_' joined keys, the joined
+    keys cached; one per writer, so threads don't share state """
+
+    MAX_PATHS = 10000
+
+    def __init__(self):
+        self.paths = {}
+
+    def _path(self, prefix, key):
+        path = self.paths.get((prefix, key))
+        if path is None:
+            if len(self.paths) >= self.MAX_PATHS:
+                self.paths.clear()
+            name = Convertor.to_string(key)
+            path = name if prefix is None else prefix + '_' + name
+            self.paths[(prefix, key)] = path
+        return path
+
+    def flatten(self, row):
+        flat = OrderedDict()
+        stack = [(None, key, value) for key, value in reversed(list(row.items()))]
+        while stack:
+            prefix, key, value = stack.pop()
+            path = self._path(prefix, key)
+            if isinstance(value, dict):
+                items = list(value.items())
+            elif isinstance(value, list):
+                items = list(enumerate(value))
+            else:
+                flat[path] = '' if value is None else Convertor.to_string(value)
+                continue
+            stack.extend((path, sub_key, sub_value) for sub_key, sub_value
+                         in reversed(items))
+        return flat
+
+
+class CsvWriter(object):
+    """ writes flattened rows to a CSV file batch by batch, the header taken
+    from the given columns or the first batch """
+
+    def __init__(self, path, columns=None, title=columnTitle):
+        self.path = path
+        self.columns = list(columns) if columns else None
+        self.title = title
+        self.flattener = Flattener()
+        self.file = None
+        self.rows = 0
+        self.dropped = set()
+
+    def write(self, rows):
+        """ appends rows to the file, returns the CSV text written """
+        flat = [self.flattener.flatten(rowMap(row)) for row in rows]
+        if not flat and self.file is not None:
+            return ''
+
+        buffer = io.StringIO()
+        if self.columns is None:
+            columns = OrderedDict()
+            for row in flat:
+                for name in row.keys():
+                    columns[name] = None
+            self.columns = list(columns)
+
+        writer = csv.DictWriter(buffer, fieldnames=self.columns,
+                                quoting=csv.QUOTE_ALL, extrasaction='ignore',
+                                lineterminator='\n')
+        if self.file is None:
+            self.file = open(self.path, 'w', newline='')
+            writer.writerow(dict((name, self.title(name))
+                                 for name in self.columns))
+
+        known = set(self.columns)
+        for row in flat:
+            self.dropped.update(name for name in row if name not in known)
+        writer.writerows(flat)
+
+        text = buffer.getvalue()
+        self.file.write(text)
+        self.rows += len(flat)
+        return text
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        if self.dropped:
+            logger.warning(
+                'Columns missing from the CSV header of %s: %s', self.path,
+                ', '.join(sorted(self.dropped)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 class Convertor(object):
-    reduced_item = None
 
     @staticmethod
     def to_string(s):
@@ -366,21 +483,20 @@ class Convertor(object):
             return s.encode('utf-8')
 
     @staticmethod
-    def reduce_item(key, value):
-
-        if type(value) is list:
-            i=0
-            for sub_item in value:
-                Convertor.reduce_item(key+'_'+Convertor.to_string(i), sub_item)
-                i=i+1
+    def csv_file_path(offset=0):
+        fname = "Sumo_CSV_Results_Entries_From_{offset}_TS_{ts}.csv".format(
+            ts=(time.time() * 1000), offset=offset)
+        return os.path.join(expanduser("~"), fname)
 
-        elif type(value) is dict:
-            sub_keys = value.keys()
-            for sub_key in sub_keys:
-                Convertor.reduce_item(key+'_'+Convertor.to_string(sub_key), value[sub_key])
+    @staticmethod
+    def sqlite_file_path(offset=0):
+        fname = "Sumo_Results_Entries_From_{offset}_TS_{ts}.db".format(
+            ts=int(time.time() * 1000), offset=offset)
+        return os.path.join(expanduser("~"), fname)
 
-        else:
-            Convertor.reduced_item[Convertor.to_string(key)] = Convertor.to_string(value)
+    @staticmethod
+    def open_file(path):
+        os.system('open {file}'.format(file=path))
 
     @staticmethod
     def json_to_csv(json_data, offset=0):
@@ -388,52 +504,31 @@ class Convertor(object):
         if not json_data:
             return
 
-        processed_data = []
-        header = []
-
-        orig_jdata = json_data
-        list_jdata = list(json_data)
-        to_process = None
-
-        if isinstance(json_data, list):
-            to_process = orig_jdata
-        else:
-            to_process = list_jdata
+        to_process = json_data if isinstance(json_data, list) else \
+            list(json_data)
 
         if len(to_process) < 1 or len(to_process[0].keys()) < 1:
             return
 
-        all_col_names = []
-
-        for row in to_process:
-            if 'map' in row.keys() and len(row.keys()) == 1:
-                row = row['map']
-            processed_data.append(row)
-            for col_name in row.keys():
-                if col_name not in all_col_names:
-                    all_col_names.append(col_name)
-
-        home = expanduser("~")
-        fname = "Sumo_CSV_Results_Entries_From_{offset}_TS_{ts}.csv".format(ts=(time.time() * 1000), offset=offset)
-        csv_file_path = os.path.join(home, fname)
-        header = all_col_names
-        header = list(set(header))
+        with CsvWriter(Convertor.csv_file_path(offset)) as writer:
+            data = writer.write(to_process)
+        Convertor.open_file(writer.path)
 
+        return data
 
-        beautified_header = OrderedDict()
+    @staticmethod
+    def json_to_sqlite(json_data, table=None, offset=0, indexes=None):
 
-        for header_col in header:
-            beautified_header[header_col] = toTitle((header_col.replace('_', '', 1)).replace('_', ' '))
+        if not json_data:
+            return
 
-        with open(csv_file_path, 'w+') as output_file:
-            dict_writer = csv.DictWriter(output_file,fieldnames=header, quoting=csv.QUOTE_ALL)
-            dict_writer.writerow(beautified_header)
-            for row in processed_data:
-                if 'map' in row.keys() and len(row.keys()) == 1:
-                    row = row['map']
-                dict_writer.writerow(row)
-        output_file.close()
-        data = open(csv_file_path).read()
-        os.system('open {file}'.format(file=output_file.name))
+        export = SqliteExport(Convertor.sqlite_file_path(offset),
+                              table=table or 'results', indexes=indexes)
+        try:
+            export.write(json_data)
+            indexed = export.finish()
+        except sqlite3.Error:
+            export.abort()
+            raise
 
-        return data
+        return export.summary(indexed)
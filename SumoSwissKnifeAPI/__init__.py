@@ -2,8 +2,20 @@ __version__ = "v0.0.1"
 
 __all__ = [
     'Utils',
+    'Table',
+    'Columnar',
+    'Pipeline',
+    'Export',
     'Completion',
     'Command',
+    'Executor',
+    'JobPoller',
+    'Sharded',
+    'Spool',
+    'ResultCache',
+    'Bulk',
+    'Sync',
+    'MetadataStore',
     'Connection',
     'History',
     'Storage',
@@ -2,7 +2,12 @@ __version__ = "v0.0.1"
 
 import json
 import requests
+from requests.adapters import HTTPAdapter
 import pprint
+import time
+import random
+from email.utils import parsedate_tz, mktime_tz
+from threading import Lock, BoundedSemaphore
 from .Utils import toTitle
 import re
 
@@ -25,16 +30,127 @@ except ImportError:
     import http.cookiejar as cookielib
 
 
+class RateLimiter(object):
+    """ token bucket (rate/s, burst) plus a cap on in flight requests """
+    limiters = {}
+    limitersLock = Lock()
+
+    def __init__(self, rate=4, burst=None, maxConcurrent=10):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst else rate)
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.lock = Lock()
+        self.inFlight = BoundedSemaphore(maxConcurrent)
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity,
+                              self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def acquire(self):
+        self.inFlight.acquire()
+        while True:
+            with self.lock:
+                self._refill(time.time())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def release(self):
+        self.inFlight.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @staticmethod
+    def forKey(key, rate=4, maxConcurrent=10):
+        with RateLimiter.limitersLock:
+            limiter = RateLimiter.limiters.get(key)
+            if limiter is None:
+                limiter = RateLimiter(rate=rate, maxConcurrent=maxConcurrent)
+                RateLimiter.limiters[key] = limiter
+            return limiter
+
+
+class RetryPolicy(object):
+    retryStatuses = (429, 500, 502, 503, 504)
+    idempotentMethods = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+    def __init__(self, maxAttempts=4, backoffBase=0.5, backoffMax=30):
+        self.maxAttempts = max(1, maxAttempts)
+        self.backoffBase = backoffBase
+        self.backoffMax = backoffMax
+
+    def shouldRetry(self, method, attempt, status_code=None, error=None):
+        if attempt >= self.maxAttempts:
+            return False
+
+        idempotent = method.upper() in self.idempotentMethods
+
+        if error is not None:
+            # the request may have reached Sumo, e.g. a created search job
+            return idempotent or isinstance(
+                error, requests.exceptions.ConnectTimeout)
+
+        if status_code not in self.retryStatuses:
+            return False
+
+        # a throttled request was rejected before being processed
+        return idempotent or status_code == 429
+
+    def delay(self, attempt, response=None):
+        retry_after = self.retryAfter(response)
+        if retry_after is not None:
+            return min(retry_after, self.backoffMax)
+
+        # full jitter exponential backoff
+        return random.uniform(0, min(self.backoffMax,
+                                     self.backoffBase * (2 ** attempt)))
+
+    @staticmethod
+    def retryAfter(response):
+        if response is None:
+            return None
+
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+
+        try:
+            return max(0, float(value))
+        except ValueError:
+            parsed = parsedate_tz(value)
+            if parsed:
+                return max(0, mktime_tz(parsed) - time.time())
+        return None
+
+
 class SumoLogic(object):
+    adapters = {}
+    adaptersLock = Lock()
 
     def __init__(self, accessId, accessKey, endpoint=None,
-                 caBundle=None, cookieFile='cookies.txt'):
+                 caBundle=None, cookieFile='cookies.txt',
+                 rateLimit=4, maxConcurrent=10, retryPolicy=None,
+                 poolSize=10, gzip=True):
         self.session = requests.Session()
         self.session.auth = (accessId, accessKey)
         self.session.headers = {
                                 'content-type': 'application/json',
-                                'accept': 'application/json'
+                                'accept': 'application/json',
+                                'connection': 'keep-alive'
                                 }
+        if gzip:
+            self.session.headers['accept-encoding'] = 'gzip, deflate'
         if caBundle is not None:
             self.session.verify = caBundle
         cj = cookielib.FileCookieJar(cookieFile)
@@ -47,6 +163,33 @@ class SumoLogic(object):
             raise(requests.exceptions.InvalidURL(
                         'Sumo Endpoint should not end with a slash character'))
 
+        self.session.mount(self.endpoint + '/',
+                           SumoLogic.getAdapter(self.endpoint, poolSize))
+
+        # Sumo Logic limits are enforced per access key, across all the
+        # connections using it
+        self.limiter = RateLimiter.forKey((self.endpoint, accessId),
+                                          rate=rateLimit,
+                                          maxConcurrent=maxConcurrent)
+
+        self.retryPolicy = retryPolicy if retryPolicy else RetryPolicy()
+        self.retryCounts = {}
+        self.retryCountsLock = Lock()
+
+    @staticmethod
+    def getAdapter(endpoint, poolSize=10):
+        # connections to the same endpoint share one keep-alive pool,
+        # retries are handled by RetryPolicy
+        with SumoLogic.adaptersLock:
+            adapter = SumoLogic.adapters.get(endpoint)
+            if adapter is None or adapter.poolSize < poolSize:
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=poolSize,
+                                      max_retries=0)
+                adapter.poolSize = poolSize
+                SumoLogic.adapters[endpoint] = adapter
+            return adapter
+
     def get_error(self, response):
         sumo_error = None
         errors_json_data = json.loads(response.text)
@@ -84,35 +227,58 @@ class SumoLogic(object):
 
         return sumo_cxception
 
-    def delete(self, uri=None, params=None):
-        r = self.session.delete(self.endpoint + uri, params=params)
+    def request(self, method, uri, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            r = None
+            try:
+                with self.limiter:
+                    r = self.session.request(method, self.endpoint + uri,
+                                             **kwargs)
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                if not self.retryPolicy.shouldRetry(method, attempt,
+                                                    error=e):
+                    raise
+            else:
+                if not self.retryPolicy.shouldRetry(method, attempt,
+                                                    status_code=r.status_code):
+                    break
+
+            self.countRetry(uri)
+            time.sleep(self.retryPolicy.delay(attempt, r))
+
         if 400 <= r.status_code < 600:
             error = self.get_error(r)
             raise error
         return r
 
+    def countRetry(self, uri):
+        # collapse object ids so counters are per resource type
+        resource_name = re.sub(r'/(\d+|[0-9A-Fa-f]{16})(?=/|$)', '/{id}',
+                               uri.split('?')[0])
+        with self.retryCountsLock:
+            self.retryCounts[resource_name] = \
+                self.retryCounts.get(resource_name, 0) + 1
+
+    def getRetryCounts(self):
+        with self.retryCountsLock:
+            return dict(self.retryCounts)
+
+    def delete(self, uri=None, params=None):
+        return self.request('DELETE', uri, params=params)
+
     def get(self, uri=None, params=None):
-        r = self.session.get(self.endpoint + uri, params=params)
-        if 400 <= r.status_code < 600:
-            error = self.get_error(r)
-            raise error
-        return r
+        return self.request('GET', uri, params=params)
 
     def post(self, uri=None, params=None, headers=None):
-        r = self.session.post(self.endpoint + uri,
-                              data=json.dumps(params), headers=headers)
-        if 400 <= r.status_code < 600:
-            error = self.get_error(r)
-            raise error
-        return r
+        return self.request('POST', uri, data=json.dumps(params),
+                            headers=headers)
 
     def put(self, uri=None, params=None, headers=None):
-        r = self.session.put(self.endpoint + uri,
-                             data=json.dumps(params), headers=headers)
-        if 400 <= r.status_code < 600:
-            error = self.get_error(r)
-            raise error
-        return r
+        return self.request('PUT', uri, data=json.dumps(params),
+                            headers=headers)
 
     def get_resources(self,
                       method='get',